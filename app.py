@@ -2,18 +2,31 @@
 Mental Health Chatbot - Main application
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import (Flask, Response, g, render_template, request, jsonify, session, stream_with_context,
+                   send_from_directory, url_for)
+import math
+import mimetypes
 import os
+import time
 import uuid
 import traceback
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Import utility modules
-from utils.mental_health_utils import detect_mental_health_issues, get_concern_level
-from utils.exercise_suggestions import get_exercise_for_state
-from utils.mental_health_resources import get_resources_by_concern
-from utils.response_generator import generate_response
+from utils.mental_health_utils import detect_mental_health_issues, get_concern_level, get_classifier_mode
+from utils.catalog import get_catalog, encode_json
+from utils.crisis import is_crisis, crisis_reply
+from utils.response_generator import (generate_response, generate_response_stream, warm_up, context_assembler,
+                                      response_cache, llm_router, model_flights)
+from utils.batch_analysis import analyze_messages
+from utils.conversation_store import create_conversation_store
+from utils.transcript_archive import create_transcript_archiver, ArchivedConversationStore
+from utils.admission import create_admission_controller
+from utils.compression import compress_response, negotiate_encoding
+from utils.static_assets import AssetManifest, load_manifest, DIST_SUBDIR, ENCODING_EXTENSIONS, IMMUTABLE_CACHE_CONTROL
+from utils.trend_tracker import update_trend, higher_concern_level
+from utils.metrics import (timed, render_prometheus, register_gauge_source, SamplingProfiler,
+                           REQUEST_LATENCY, ERRORS, CRISIS_RESPONSES)
 
 # Load environment variables
 load_dotenv()
@@ -22,8 +35,123 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", os.urandom(16))
 
-# Dictionary to store conversations
-conversations = {}
+# Lazy mode (the default) defers the model client setup to the first chat
+# request; LAZY_INIT=False builds the shared model pool at startup instead
+if os.getenv("LAZY_INIT", "True") != 'True':
+    warm_up(connect=os.getenv("WARM_UP_CONNECT") == 'True')
+    if get_classifier_mode() != "keyword":
+        from utils.semantic_classifier import get_semantic_classifier
+        get_semantic_classifier()
+
+# Bounded store for conversation history (see utils/conversation_store.py)
+conversations = create_conversation_store()
+
+# Write-behind transcript archive, on when TRANSCRIPT_ARCHIVE_DIR is set
+# (see utils/transcript_archive.py)
+transcript_archiver = create_transcript_archiver()
+if transcript_archiver is not None:
+    conversations = ArchivedConversationStore(conversations, transcript_archiver)
+
+# Fingerprinted, pre-compressed CSS and JavaScript (see utils/static_assets.py)
+assets = AssetManifest(load_manifest(app.static_folder))
+
+# Rate limits and load shedding for the chat endpoints (see utils/admission.py)
+admission = create_admission_controller()
+
+# Upper bound on messages accepted by a single /api/analyze/batch request
+BATCH_ANALYZE_MAX_MESSAGES = int(os.getenv("BATCH_ANALYZE_MAX_MESSAGES", 50000))
+
+# Per-request sampling profiler, switched on per request with an
+# "X-Profile: 1" header (or ?profile=1) when PROFILING_ENABLED=True
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == 'True'
+
+# Crisis messages get the vetted reply and crisis resources at once instead
+# of waiting on the model; CRISIS_FOLLOW_UP adds a model-written reply after
+# it on the streaming endpoint
+CRISIS_FAST_PATH = os.getenv("CRISIS_FAST_PATH", "True") == 'True'
+CRISIS_FOLLOW_UP = os.getenv("CRISIS_FOLLOW_UP", "True") == 'True'
+
+# Export store and cache counters on /metrics
+register_gauge_source('conversation_store', conversations.metrics)
+if transcript_archiver is not None:
+    register_gauge_source('transcript_archive', transcript_archiver.metrics)
+register_gauge_source('response_cache', response_cache.metrics)
+register_gauge_source('llm', llm_router.metrics)
+register_gauge_source('model_flights', model_flights.metrics)
+register_gauge_source('admission', admission.metrics)
+
+@app.before_request
+def start_request_timer():
+    """Start request timing and, if asked for, the sampling profiler"""
+    g.request_started = time.perf_counter()
+    if PROFILING_ENABLED and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request latency and report the profile when one was taken"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, str(response.status_code))
+    
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        print(f"{request.method} {request.path}\n{profiler.report()}")
+        response.headers['X-Profile-Samples'] = str(sum(profiler.samples.values()))
+    return response
+
+@app.after_request
+def compress_and_validate(response):
+    """
+    Compress large API and page responses, and let browsers revalidate the
+    page with its ETag instead of downloading it again
+    """
+    response = compress_response(response, request.accept_encodings)
+    if request.endpoint == 'home' and response.status_code == 200:
+        response.headers['Cache-Control'] = 'no-cache'
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': lambda filename: url_for('static', filename=assets.url_filename(filename))}
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """Serve a fingerprinted asset, pre-compressed if the client accepts it"""
+    dist_dir = os.path.join(app.static_folder, DIST_SUBDIR)
+    entry = assets.entry(filename)
+    if entry is None:
+        # Only files of the current build have names that never change;
+        # anything else (such as manifest.json) must be revalidated
+        response = send_from_directory(dist_dir, filename, conditional=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings, entry['encodings'])
+    response = send_from_directory(
+        dist_dir,
+        filename + ENCODING_EXTENSIONS[encoding] if encoding else filename,
+        mimetype=mimetypes.guess_type(filename)[0],
+        etag=f"{entry['etag']}-{encoding or 'identity'}",
+        conditional=True
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+@app.teardown_request
+def flush_conversations(exc):
+    """Commit buffered conversation writes once per request"""
+    try:
+        conversations.flush()
+    except Exception as e:
+        print(f"Error flushing conversation store: {str(e)}")
 
 # Error handler for all routes
 @app.errorhandler(Exception)
@@ -42,10 +170,123 @@ def home():
     # Generate a session ID if one doesn't exist
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-        conversations[session['session_id']] = []
+        conversations.create_session(session['session_id'])
     
     return render_template('index.html')
 
+def get_chat_session_id():
+    """Return the current session ID, starting a new session if needed"""
+    session_id = session.get('session_id')
+    if not session_id or not conversations.has_session(session_id):
+        session_id = str(uuid.uuid4())
+        session['session_id'] = session_id
+        conversations.create_session(session_id)
+    return session_id
+
+def detect_message(user_message):
+    """Run mental health detection, timed as its own stage"""
+    with timed("detection"):
+        return detect_mental_health_issues(user_message)
+
+def analyze_message(user_message, session_id, mental_health_data=None):
+    """
+    Run mental health detection (unless already done) and update the
+    session's trend. Returns (analysis, concern level, trend)
+    """
+    if mental_health_data is None:
+        mental_health_data = detect_message(user_message)
+    with timed("concern_level"):
+        concern_level = get_concern_level(mental_health_data)
+    with timed("trend"):
+        trend = update_trend(conversations, session_id, mental_health_data)
+    return mental_health_data, concern_level, trend
+
+def get_response_extras(mental_health_data, concern_level, trend):
+    """Pick the exercise suggestion and resources sent with a reply"""
+    with timed("exercise_resources"):
+        return _get_response_extras(mental_health_data, concern_level, trend)
+
+def _get_response_extras(mental_health_data, concern_level, trend):
+    # Determine if we should add an exercise suggestion
+    should_add_exercise = any(score > 0.3 for score in [
+        mental_health_data['anxiety'],
+        mental_health_data['depression'],
+        mental_health_data['burnout']
+    ])
+    
+    # Resources and exercises come from the prebuilt, pre-encoded catalog
+    catalog = get_catalog()
+    
+    exercise_suggestion = None
+    if should_add_exercise:
+        # Find the most prominent issue
+        issues = {
+            'anxiety': mental_health_data['anxiety'],
+            'depression': mental_health_data['depression'],
+            'burnout': mental_health_data['burnout']
+        }
+        prominent_issue = max(issues, key=issues.get)
+        exercise_suggestion = catalog.exercise(prominent_issue)
+    
+    # Get appropriate resources based on the message or the session trend,
+    # whichever is more concerning
+    trend_concern_level = trend.concern_level()
+    resource_level = higher_concern_level(concern_level, trend_concern_level)
+    resources = catalog.resources(resource_level)
+    
+    return {
+        'exercise': exercise_suggestion if exercise_suggestion else None,
+        'resources': resources if resource_level in ['moderate', 'high', 'critical'] else None,
+        'concern_level': concern_level,
+        'trend_concern_level': trend_concern_level,
+        'trend_escalating': trend.escalating
+    }
+
+def check_admission(mental_health_data):
+    """
+    Apply the rate limits and the overload check to a chat request.
+    Returns a 429 response if it should be refused, otherwise None.
+    Crisis messages are always admitted.
+    """
+    crisis = is_crisis(mental_health_data)
+    wait = admission.check_rate(session.get('session_id'), request.remote_addr, crisis)
+    if wait:
+        return too_many_requests(
+            "You're sending messages faster than I can answer. Please wait a moment and try again.", wait
+        )
+    if admission.reject_overloaded(crisis):
+        return too_many_requests(
+            "I'm receiving a lot of messages right now. Please try again in a moment.", 1
+        )
+    return None
+
+def too_many_requests(message, retry_after):
+    response = jsonify({
+        'error': 'Too many requests',
+        'message': message,
+        'resources': None,
+        'exercise': None
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def read_chat_message():
+    """
+    Return (message, None) for a JSON object with a non-empty string
+    message, otherwise (None, error response)
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, (jsonify({'error': 'Request must be a JSON object'}), 400)
+    user_message = data.get('message', '')
+    if not isinstance(user_message, str):
+        return None, (jsonify({'error': 'Message must be a string'}), 400)
+    user_message = user_message.strip()
+    if not user_message:
+        return None, (jsonify({'error': 'Message is required'}), 400)
+    return user_message, None
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -56,79 +297,62 @@ def chat():
                 'message': "I'm sorry, there was an error processing your request."
             }), 400
             
-        data = request.get_json()
-        user_message = data.get('message', '').strip()
-        session_id = session.get('session_id')
+        user_message, invalid = read_chat_message()
+        if invalid is not None:
+            return invalid
         
-        if not user_message:
-            return jsonify({'error': 'Message is required'}), 400
+        # Detection comes first so crisis messages skip the limits
+        mental_health_data = detect_message(user_message)
+        refused = check_admission(mental_health_data)
+        if refused is not None:
+            return refused
         
-        if not session_id or session_id not in conversations:
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
-            conversations[session_id] = []
+        session_id = get_chat_session_id()
         
         # Add user message to conversation history
-        conversations[session_id].append({
-            'role': 'user',
-            'content': user_message,
-            'timestamp': datetime.now().isoformat()
-        })
+        conversations.append(session_id, 'user', user_message)
         
         try:
             # Analyze mental health issues in the message
-            mental_health_data = detect_mental_health_issues(user_message)
-            concern_level = get_concern_level(mental_health_data)
+            mental_health_data, concern_level, trend = analyze_message(user_message, session_id,
+                                                                       mental_health_data)
+            
+            # Crisis messages skip the model call and extras entirely
+            if CRISIS_FAST_PATH and is_crisis(mental_health_data):
+                CRISIS_RESPONSES.inc("chat")
+                response = crisis_reply(get_catalog(), trend)
+                conversations.append(session_id, 'assistant', response['message'])
+                return Response(encode_json(response), status=200, mimetype='application/json')
             
             # Generate a response based on the analysis
             bot_response = generate_response(
                 user_message, 
                 mental_health_data,
-                conversations[session_id]
+                conversations.get_history(session_id),
+                session_id=session_id
             )
             
-            # Determine if we should add an exercise suggestion
-            should_add_exercise = any(score > 0.3 for score in [
-                mental_health_data['anxiety'],
-                mental_health_data['depression'],
-                mental_health_data['burnout']
-            ])
-            
-            exercise_suggestion = None
-            if should_add_exercise:
-                # Find the most prominent issue
-                issues = {
-                    'anxiety': mental_health_data['anxiety'],
-                    'depression': mental_health_data['depression'],
-                    'burnout': mental_health_data['burnout']
-                }
-                prominent_issue = max(issues, key=issues.get)
-                exercise_suggestion = get_exercise_for_state(prominent_issue)
-            
-            # Get appropriate resources based on concern level
-            resources = get_resources_by_concern(concern_level)
+            extras = get_response_extras(mental_health_data, concern_level, trend)
             
             # Add bot response to conversation history
-            conversations[session_id].append({
-                'role': 'assistant',
-                'content': bot_response,
-                'timestamp': datetime.now().isoformat()
-            })
+            conversations.append(session_id, 'assistant', bot_response)
             
             # Ensure all response components are properly structured
             response = {
                 'status': 'success',
                 'message': bot_response,
-                'exercise': exercise_suggestion if exercise_suggestion else None,
-                'resources': resources if concern_level in ['moderate', 'high', 'critical'] else None,
-                'concern_level': concern_level
+                **extras
             }
             
-            return jsonify(response), 200
+            # Static resources and exercises are spliced in already encoded
+            with timed("json_serialization"):
+                body = encode_json(response)
+            return Response(body, status=200, mimetype='application/json')
             
         except Exception as e:
             print(f"Error processing message: {str(e)}")
             print(traceback.format_exc())
+            ERRORS.inc("chat")
             return jsonify({
                 'error': 'Processing error',
                 'message': "I apologize, but I encountered an error while processing your message. Please try again.",
@@ -139,6 +363,7 @@ def chat():
     except Exception as e:
         print(f"Error in /api/chat: {str(e)}")
         print(traceback.format_exc())
+        ERRORS.inc("chat")
         
         return jsonify({
             'error': str(e)[:200],
@@ -146,13 +371,124 @@ def chat():
             'resources': None,
             'exercise': None
         }), 500
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {encode_json(data).decode('utf-8')}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same as /api/chat, but streams the reply as Server-Sent Events"""
+    if not request.is_json:
+        return jsonify({
+            'error': 'Request must be JSON',
+            'message': "I'm sorry, there was an error processing your request."
+        }), 400
+        
+    user_message, invalid = read_chat_message()
+    if invalid is not None:
+        return invalid
+    
+    mental_health_data = detect_message(user_message)
+    refused = check_admission(mental_health_data)
+    if refused is not None:
+        return refused
+    
+    session_id = get_chat_session_id()
+    conversations.append(session_id, 'user', user_message)
+    
+    mental_health_data, concern_level, trend = analyze_message(user_message, session_id, mental_health_data)
+    
+    # Crisis messages get the vetted reply and resources as the first event,
+    # then optionally a model-written follow-up on the priority lane
+    crisis = None
+    if CRISIS_FAST_PATH and is_crisis(mental_health_data):
+        CRISIS_RESPONSES.inc("chat_stream")
+        crisis = crisis_reply(get_catalog(), trend, follow_up=CRISIS_FOLLOW_UP)
+        conversations.append(session_id, 'assistant', crisis['message'])
+    history = conversations.get_history(session_id)
+    
+    def events():
+        chunks = []
+        try:
+            if crisis is not None:
+                yield format_sse('crisis', crisis)
+                if CRISIS_FOLLOW_UP:
+                    # No canned text if the model can't answer; the user already has one
+                    for text in generate_response_stream(user_message, mental_health_data, history,
+                                                         session_id=session_id, fallback=False):
+                        chunks.append(text)
+                        yield format_sse('token', {'text': text})
+                yield format_sse('done', {'status': 'success', 'resources': None, 'exercise': None})
+                return
+            
+            yield format_sse('meta', {
+                'concern_level': concern_level,
+                'trend_concern_level': trend.concern_level()
+            })
+            
+            for text in generate_response_stream(user_message, mental_health_data, history,
+                                                 session_id=session_id):
+                chunks.append(text)
+                yield format_sse('token', {'text': text})
+            
+            extras = get_response_extras(mental_health_data, concern_level, trend)
+            yield format_sse('done', {'status': 'success', **extras})
+            
+        except Exception as e:
+            print(f"Error in /api/chat/stream: {str(e)}")
+            print(traceback.format_exc())
+            ERRORS.inc("chat_stream")
+            yield format_sse('error', {
+                'error': 'Processing error',
+                'message': "I apologize, but I encountered an error while processing your message. Please try again."
+            })
+        finally:
+            if chunks:
+                conversations.append(session_id, 'assistant', ''.join(chunks))
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Score many messages at once without going through the chat pipeline"""
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+        
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request must be a JSON object'}), 400
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({'error': 'messages must be a list of strings'}), 400
+    if len(messages) > BATCH_ANALYZE_MAX_MESSAGES:
+        return jsonify({
+            'error': f'At most {BATCH_ANALYZE_MAX_MESSAGES} messages are allowed per request'
+        }), 413
+    
+    scores = analyze_messages(messages)
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(messages),
+        'results': {key: column.tolist() for key, column in scores.items()}
+    }), 200
+    
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
     
 @app.route('/api/reset', methods=['POST'])
 def reset_conversation():
     try:
         session_id = session.get('session_id')
-        if session_id and session_id in conversations:
-            conversations[session_id] = []
+        if session_id:
+            conversations.reset(session_id)
+            context_assembler.forget(session_id)
         
         return jsonify({
             'message': 'Conversation reset successfully',
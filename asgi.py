@@ -0,0 +1,279 @@
+"""
+Mental Health Chatbot - ASGI entry point
+
+Serves /api/chat on an asyncio event loop so one process can keep many
+model calls in flight. Every other route is handled by the Flask app on
+a thread pool, so slow routes such as /api/chat/stream run side by side.
+
+Run with:
+    uvicorn asgi:app --workers 1
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.http import dump_cookie, parse_accept_header
+
+from app import (app as flask_app, conversations, analyze_message, detect_message, get_response_extras,
+                 admission, CRISIS_FAST_PATH)
+from utils.async_pipeline import ConcurrencyLimiter, ServerOverloaded
+from utils.metrics import timed, register_gauge_source, ERRORS, CRISIS_RESPONSES
+from utils.catalog import encode_json, get_catalog
+from utils.compression import COMPRESS_MIN_BYTES, compress, negotiate_encoding
+from utils.crisis import is_crisis, crisis_reply
+from utils.response_generator import generate_response_async, async_model_flights
+
+# Largest request body accepted by the async chat route
+MAX_BODY_BYTES = 64 * 1024
+# Threads running the Flask routes; each open event stream holds one
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 64))
+
+_wsgi_executor = None
+_wsgi_executor_pid = None
+_wsgi_executor_lock = threading.Lock()
+
+def get_wsgi_executor():
+    """
+    Thread pool for the Flask routes, created on first use and again in a
+    forked worker
+    """
+    global _wsgi_executor, _wsgi_executor_pid
+    if _wsgi_executor_pid != os.getpid():
+        with _wsgi_executor_lock:
+            if _wsgi_executor_pid != os.getpid():
+                _wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+                _wsgi_executor_pid = os.getpid()
+    return _wsgi_executor
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    """
+    asgiref runs WSGI apps on its one thread-sensitive thread, so requests
+    would be served one at a time; run each on the thread pool instead
+    """
+
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        await sync_to_async(run, thread_sensitive=False, executor=get_wsgi_executor())(self, body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class RequestTooLarge(Exception):
+    """Raised when a request body is over MAX_BODY_BYTES"""
+
+
+flask_asgi = PooledWsgiToAsgi(flask_app)
+limiter = ConcurrencyLimiter()
+register_gauge_source('async_limiter', limiter.metrics)
+register_gauge_source('async_model_flights', async_model_flights.metrics)
+
+
+def load_session(scope):
+    """
+    Read the signed Flask session cookie so both serving paths share sessions
+    """
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookie = SimpleCookie(value.decode('latin-1')).get(cookie_name)
+            if cookie is not None:
+                try:
+                    return dict(serializer.loads(cookie.value))
+                except Exception:
+                    return {}
+    return {}
+
+def dump_session(data):
+    """
+    Build the Set-Cookie header value for an updated session
+    """
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    return dump_cookie(
+        flask_app.config['SESSION_COOKIE_NAME'],
+        serializer.dumps(data),
+        path='/',
+        httponly=True,
+        samesite=flask_app.config['SESSION_COOKIE_SAMESITE']
+    )
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            raise RequestTooLarge(f"Request body is over {MAX_BODY_BYTES} bytes")
+        if not message.get('more_body'):
+            return body
+
+def get_accept_encodings(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'accept-encoding':
+            return parse_accept_header(value.decode('latin-1'))
+    return parse_accept_header('')
+
+async def send_json(send, status, payload, headers=(), accept_encodings=None):
+    """
+    Send a JSON response, compressed when it is large enough and
+    accept_encodings (the client's Accept-Encoding) allows it
+    """
+    with timed("json_serialization"):
+        body = encode_json(payload)
+    headers = [*headers, (b'vary', b'Accept-Encoding')]
+    if accept_encodings is not None and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(accept_encodings)
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode('latin-1')))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+def start_turn(session_id, user_message):
+    """
+    Find or create the session and record the user's message. The store
+    may block on SQLite or its lock, so this runs on a thread.
+    Returns (session id, whether a new session was created).
+    """
+    created = False
+    if not session_id or not conversations.has_session(session_id):
+        session_id = str(uuid.uuid4())
+        conversations.create_session(session_id)
+        created = True
+    conversations.append(session_id, 'user', user_message)
+    return session_id, created
+
+async def chat(scope, receive, send):
+    """
+    Async equivalent of app.chat: analysis runs inline, the model call is
+    awaited and the concurrency limiter sheds load when the process is full.
+    """
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+    except RequestTooLarge:
+        await send_json(send, 413, {'error': f'Request body must be at most {MAX_BODY_BYTES} bytes'})
+        return
+    except ValueError:
+        await send_json(send, 400, {
+            'error': 'Request must be JSON',
+            'message': "I'm sorry, there was an error processing your request."
+        })
+        return
+
+    if not isinstance(data, dict):
+        await send_json(send, 400, {'error': 'Request must be a JSON object'})
+        return
+    user_message = data.get('message', '')
+    if not isinstance(user_message, str):
+        await send_json(send, 400, {'error': 'Message must be a string'})
+        return
+    user_message = user_message.strip()
+    if not user_message:
+        await send_json(send, 400, {'error': 'Message is required'})
+        return
+
+    session_data = load_session(scope)
+    session_id = session_data.get('session_id')
+
+    # Same admission rules as the Flask routes; crisis messages always pass
+    mental_health_data = detect_message(user_message)
+    crisis = is_crisis(mental_health_data)
+    client = scope.get('client')
+    # The buckets may live in SQLite, so check them off the event loop
+    wait = await asyncio.to_thread(admission.check_rate, session_id, client[0] if client else None, crisis)
+    if wait or admission.reject_overloaded(crisis):
+        await send_json(send, 429, {
+            'error': 'Too many requests',
+            'message': "You're sending messages faster than I can answer. Please wait a moment and try again."
+                       if wait else "I'm receiving a lot of messages right now. Please try again in a moment.",
+            'resources': None,
+            'exercise': None
+        }, [(b'retry-after', str(max(1, math.ceil(wait))).encode('latin-1'))])
+        return
+
+    headers = []
+    session_id, created = await asyncio.to_thread(start_turn, session_id, user_message)
+    if created:
+        session_data['session_id'] = session_id
+        headers.append((b'set-cookie', dump_session(session_data).encode('latin-1')))
+
+    try:
+        mental_health_data, concern_level, trend = await asyncio.to_thread(
+            analyze_message, user_message, session_id, mental_health_data
+        )
+
+        # Crisis messages are answered straight away, without a model call
+        if CRISIS_FAST_PATH and crisis:
+            CRISIS_RESPONSES.inc("async_chat")
+            response = crisis_reply(get_catalog(), trend)
+            await asyncio.to_thread(conversations.append, session_id, 'assistant', response['message'])
+            await send_json(send, 200, response, headers, get_accept_encodings(scope))
+            return
+
+        bot_response = await limiter.run(
+            generate_response_async,
+            user_message,
+            mental_health_data,
+            await asyncio.to_thread(conversations.get_history, session_id),
+            session_id,
+            priority=crisis
+        )
+
+        extras = get_response_extras(mental_health_data, concern_level, trend)
+        await asyncio.to_thread(conversations.append, session_id, 'assistant', bot_response)
+
+        await send_json(send, 200, {
+            'status': 'success',
+            'message': bot_response,
+            **extras
+        }, headers, get_accept_encodings(scope))
+
+    except ServerOverloaded:
+        await send_json(send, 503, {
+            'error': 'Server busy',
+            'message': "I'm receiving a lot of messages right now. Please try again in a moment.",
+            'resources': None,
+            'exercise': None
+        }, [*headers, (b'retry-after', b'1')])
+
+    except Exception as e:
+        print(f"Error in async /api/chat: {str(e)}")
+        print(traceback.format_exc())
+        ERRORS.inc("chat")
+        await send_json(send, 500, {
+            'error': 'Processing error',
+            'message': "I apologize, but I encountered an error while processing your message. Please try again.",
+            'resources': None,
+            'exercise': None
+        }, headers)
+
+    finally:
+        # Disk-backed stores commit here; keep that off the event loop
+        await asyncio.to_thread(conversations.flush)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST':
+        await chat(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
@@ -0,0 +1,109 @@
+"""
+Benchmark Baseline - Runs the micro benchmarks and a fixed load test, and
+records or checks the results against benchmarks/baseline.json
+
+Usage:
+    python -m benchmarks.baseline            # run and print
+    python -m benchmarks.baseline --write    # save as the new baseline
+    python -m benchmarks.baseline --check    # exit 1 on a regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+
+from benchmarks import micro, load_test
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Fixed load test scenarios, so runs are comparable
+LOAD_SCENARIOS = {
+    'chat': {'requests': 400, 'concurrency': 16, 'stream': False,
+             'latency_ms': 50.0, 'jitter_ms': 10.0, 'failure_rate': 0.05, 'seed': 7},
+    'chat_stream': {'requests': 200, 'concurrency': 16, 'stream': True,
+                    'latency_ms': 50.0, 'jitter_ms': 10.0, 'failure_rate': 0.05,
+                    'chunk_delay_ms': 5.0, 'seed': 7},
+}
+
+# Allowed slowdown before a result counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Extra allowance for micro timings: sub-microsecond calls can take up to
+# 1.75x as long from one run to the next on the same machine
+MICRO_NOISE_NS = 500
+# Tail latencies rest on a few samples (the p99 of 400 requests is 4 of
+# them), so they get more slack than the median
+TAIL_TOLERANCES = {'p95_ms': 0.5, 'p99_ms': 1.0}
+
+def collect(number=20000):
+    """
+    Run every benchmark and return the results as a flat-ish dict
+    """
+    results = {
+        'python': platform.python_version(),
+        'micro_ns_per_call': micro.run(number),
+        'load': {}
+    }
+    for name, scenario in LOAD_SCENARIOS.items():
+        summary = load_test.run(**scenario)
+        results['load'][name] = {
+            key: summary[key] for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'status_counts')
+        }
+    return results
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return a list of regression messages; lower is better for timings and
+    higher is better for throughput
+    """
+    regressions = []
+    for name, ns in current['micro_ns_per_call'].items():
+        previous = baseline.get('micro_ns_per_call', {}).get(name)
+        if previous and ns > previous * (1 + tolerance) + MICRO_NOISE_NS:
+            regressions.append(f"{name}: {ns:.1f} ns/call vs {previous:.1f} baseline")
+
+    for scenario, summary in current['load'].items():
+        previous = baseline.get('load', {}).get(scenario)
+        if not previous:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            allowed = max(tolerance, TAIL_TOLERANCES.get(key, 0.0))
+            if summary[key] > previous[key] * (1 + allowed):
+                regressions.append(f"{scenario} {key}: {summary[key]:.1f} vs {previous[key]:.1f} baseline")
+        if summary['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{scenario} throughput: {summary['throughput_rps']:.1f} vs "
+                f"{previous['throughput_rps']:.1f} req/s baseline"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--write", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="compare against the saved baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--number", type=int, default=20000, help="micro benchmark iterations")
+    args = parser.parse_args()
+
+    results = collect(args.number)
+    print(json.dumps(results, indent=2))
+
+    if args.write:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Fake Gemini Backend - Local stand-in for google.generativeai so the app can
+be benchmarked without network access or an API key
+
+The fake exposes the small part of the client the app uses (configure,
+GenerativeModel.generate_content with and without streaming,
+generate_content_async and count_tokens) with configurable latency, token
+streaming speed and failure rate.
+
+Usage:
+    from benchmarks import fake_genai
+    fake_genai.install(latency_ms=300, failure_rate=0.05)
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+# Reply used for every request; long enough to stream in several chunks
+DEFAULT_REPLY = (
+    "I understand, and it's completely normal to feel this way. You're not alone in this. "
+    "It might help to take a few slow, deep breaths and focus on one small thing you can do "
+    "right now. Be gentle with yourself - you're doing the best you can, and I'm here to listen."
+)
+
+
+class FakeGenAIError(Exception):
+    """Raised by the fake backend to simulate an API failure"""
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeBackend:
+    """
+    Shared settings and counters for every fake model.
+
+    latency_ms is the time to the first token, jitter_ms adds uniform noise
+    to it, and chunk_delay_ms is the gap between streamed chunks of
+    words_per_chunk words. failure_rate is the probability that a call
+    raises FakeGenAIError.
+    """
+
+    def __init__(self, latency_ms=200.0, jitter_ms=0.0, failure_rate=0.0, words_per_chunk=4,
+                 chunk_delay_ms=20.0, reply=DEFAULT_REPLY, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.words_per_chunk = words_per_chunk
+        self.chunk_delay_ms = chunk_delay_ms
+        self.reply = reply
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def _plan_call(self):
+        """
+        Count a call and return (delay in seconds, whether it fails)
+        """
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            fails = self._random.random() < self.failure_rate
+            if fails:
+                self.failures += 1
+        return max(0.0, self.latency_ms + jitter) / 1000, fails
+
+    def chunks(self):
+        words = self.reply.split(" ")
+        for start in range(0, len(words), self.words_per_chunk):
+            text = " ".join(words[start:start + self.words_per_chunk])
+            yield text if start == 0 else " " + text
+
+    def metrics(self):
+        with self._lock:
+            return {'calls': self.calls, 'failures': self.failures}
+
+
+def _request_timeout(request_options):
+    return (request_options or {}).get("timeout")
+
+def _wait(delay, timeout):
+    """
+    Sleep for the simulated latency, giving up at the client timeout
+    like the real client would
+    """
+    if timeout is not None and delay > timeout:
+        time.sleep(timeout)
+        raise FakeGenAIError("Simulated request timeout")
+    time.sleep(delay)
+
+
+class FakeGenerativeModel:
+    def __init__(self, backend, model_name=None, generation_config=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.generation_config = generation_config
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        delay, fails = self.backend._plan_call()
+        timeout = _request_timeout(request_options)
+        if stream:
+            return self._stream(delay, fails, timeout)
+        _wait(delay, timeout)
+        if fails:
+            raise FakeGenAIError("Simulated API failure")
+        return FakeResponse(self.backend.reply)
+
+    def _stream(self, delay, fails, timeout):
+        _wait(delay, timeout)
+        if fails:
+            raise FakeGenAIError("Simulated API failure")
+        for index, text in enumerate(self.backend.chunks()):
+            if index:
+                time.sleep(self.backend.chunk_delay_ms / 1000)
+            yield FakeResponse(text)
+
+    async def generate_content_async(self, prompt, request_options=None):
+        delay, fails = self.backend._plan_call()
+        timeout = _request_timeout(request_options)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise FakeGenAIError("Simulated request timeout")
+        await asyncio.sleep(delay)
+        if fails:
+            raise FakeGenAIError("Simulated API failure")
+        return FakeResponse(self.backend.reply)
+
+    def count_tokens(self, contents):
+        return len(str(contents)) // 4 + 1
+
+
+class FakeGenAI:
+    """
+    Module-like object standing in for google.generativeai
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def configure(self, api_key=None):
+        pass
+
+    def list_models(self):
+        return []
+
+    def GenerativeModel(self, model_name=None, generation_config=None):
+        return FakeGenerativeModel(self.backend, model_name, generation_config)
+
+
+def install(**settings):
+    """
+    Route every concern level to a Gemini provider backed by a fake built
+    from settings (see FakeBackend). The response cache is cleared so no
+    replies from a previous backend leak in. Returns the backend.
+    """
+    from utils import response_generator
+    from utils.llm_providers import GeminiProvider
+
+    backend = FakeBackend(**settings)
+    router = response_generator.llm_router
+    router.register(GeminiProvider(
+        response_generator.MODEL_NAME,
+        response_generator.GENERATION_CONFIGS,
+        client=FakeGenAI(backend)
+    ))
+    router.default = "gemini"
+    router.routes = {}
+    response_generator.response_cache.clear()
+    return backend
@@ -0,0 +1,149 @@
+"""
+Load Test - Drives /api/chat concurrently and reports latency percentiles
+and throughput
+
+By default the app runs in-process behind the fake Gemini backend, one
+Flask test client (and so one chat session) per worker thread. With --url
+the requests go over HTTP to a running server instead, and the fake
+backend settings are ignored.
+
+Usage:
+    python -m benchmarks.load_test [--requests 500] [--concurrency 16]
+        [--latency-ms 200] [--failure-rate 0.0] [--stream] [--url URL]
+"""
+
+import argparse
+import http.cookiejar
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.micro import SAMPLE_MESSAGES
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, payload):
+        response = self.client.post(path, json=payload)
+        # Read the whole body so streamed replies are timed to the last event
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def summarize(latencies, statuses, elapsed):
+    """
+    Return latency percentiles (ms), throughput and status counts
+    """
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        'requests': len(latencies),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(latencies_ms.mean()),
+        'max_ms': float(latencies_ms.max()),
+        'throughput_rps': len(latencies) / elapsed,
+        'status_counts': counts
+    }
+
+def run(requests=500, concurrency=16, stream=False, url=None, **fake_settings):
+    """
+    Send requests to /api/chat (or /api/chat/stream) from concurrency
+    workers and return the summary. fake_settings are passed to
+    fake_genai.install for in-process runs.
+    """
+    if url is None:
+        from benchmarks import fake_genai
+        backend = fake_genai.install(**fake_settings)
+        from app import app, admission
+        from utils.admission import InMemoryRateLimiter
+        # All workers share one address, so lift the rate limits; the cap
+        # on model calls in flight still applies
+        admission.session_limiter = InMemoryRateLimiter("session", rate=1e9, burst=1e9)
+        admission.ip_limiter = InMemoryRateLimiter("ip", rate=1e9, burst=1e9)
+        make_client = lambda: InProcessClient(app)
+    else:
+        backend = None
+        make_client = lambda: HttpClient(url)
+
+    path = '/api/chat/stream' if stream else '/api/chat'
+    local = threading.local()
+    messages = itertools.cycle(SAMPLE_MESSAGES)
+    messages_lock = threading.Lock()
+
+    def send_one(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = make_client()
+        with messages_lock:
+            message = next(messages)
+        started = time.perf_counter()
+        status = client.post(path, {'message': message})
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send_one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([latency for latency, _ in results], [status for _, status in results], elapsed)
+    summary['concurrency'] = concurrency
+    summary['endpoint'] = path
+    if backend is not None:
+        summary['model_calls'] = backend.metrics()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent workers")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform noise added to the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of fake model calls that fail")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20.0, help="gap between streamed chunks")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream")
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    args = parser.parse_args()
+
+    summary = run(
+        args.requests, args.concurrency, args.stream, args.url,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate, chunk_delay_ms=args.chunk_delay_ms
+    )
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro Benchmarks - Per-call cost of the functions on the chat hot path
+
+Usage:
+    python -m benchmarks.micro [--number 20000]
+"""
+
+import argparse
+import timeit
+
+from utils.mental_health_utils import detect_mental_health_issues
+from utils.response_generator import create_prompt
+from utils.exercise_suggestions import get_exercise_for_state
+from utils.mental_health_resources import get_resources_by_concern
+
+SAMPLE_MESSAGES = [
+    "Hi, how are you today?",
+    "I have been so stressed and anxious about work lately, I can't sleep",
+    "I feel empty and hopeless, nothing seems to matter anymore",
+    "I'm completely exhausted and burnt out from working overtime every week",
+    "Sometimes I think everyone would be better off without me",
+]
+
+SAMPLE_ANALYSES = [detect_mental_health_issues(message) for message in SAMPLE_MESSAGES]
+
+BENCHMARKS = {
+    'detect_mental_health_issues': (
+        'for message in messages: detect_mental_health_issues(message)',
+        {'detect_mental_health_issues': detect_mental_health_issues, 'messages': SAMPLE_MESSAGES}
+    ),
+    'create_prompt': (
+        'for message, analysis in pairs: create_prompt(message, analysis)',
+        {'create_prompt': create_prompt, 'pairs': list(zip(SAMPLE_MESSAGES, SAMPLE_ANALYSES))}
+    ),
+    'get_exercise_for_state': (
+        'for state in states: get_exercise_for_state(state)',
+        {'get_exercise_for_state': get_exercise_for_state,
+         'states': ['anxiety', 'depression', 'burnout', 'general', 'anxiety']}
+    ),
+    'get_resources_by_concern': (
+        'for level in levels: get_resources_by_concern(level)',
+        {'get_resources_by_concern': get_resources_by_concern,
+         'levels': ['low', 'moderate', 'high', 'critical', 'moderate']}
+    ),
+}
+
+def run(number=20000):
+    """
+    Time each function over its samples. Returns nanoseconds per call,
+    best of five repeats.
+    """
+    results = {}
+    for name, (statement, namespace) in BENCHMARKS.items():
+        calls = number * 5
+        best = min(timeit.repeat(statement, globals=namespace, number=number, repeat=5))
+        results[name] = best / calls * 1e9
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="iterations over the samples")
+    args = parser.parse_args()
+
+    for name, ns in run(args.number).items():
+        print(f"{name:>28}: {ns:10.1f} ns/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Prompt Build Benchmark - Compares the prebuilt template registry with the
+original create_prompt that rebuilt the system prompt string on every call
+
+Usage:
+    python -m benchmarks.prompt_build [--number 100000]
+"""
+
+import argparse
+import timeit
+
+from utils.response_generator import create_prompt
+
+SAMPLE_MESSAGE = "I have been so stressed and anxious about work lately"
+
+SAMPLE_ANALYSES = [
+    {'anxiety': 0.0, 'depression': 0.0, 'burnout': 0.0, 'suicidal': 0.0, 'immediate_help': False},
+    {'anxiety': 0.5, 'depression': 0.1, 'burnout': 0.2, 'suicidal': 0.0, 'immediate_help': False},
+    {'anxiety': 0.1, 'depression': 0.6, 'burnout': 0.0, 'suicidal': 0.0, 'immediate_help': False},
+    {'anxiety': 0.0, 'depression': 0.2, 'burnout': 0.4, 'suicidal': 0.0, 'immediate_help': False},
+    {'anxiety': 0.0, 'depression': 0.0, 'burnout': 0.0, 'suicidal': 1.0, 'immediate_help': True},
+]
+
+def legacy_create_prompt(user_message, mental_health_data):
+    """
+    The original create_prompt, which rebuilt the prompt on every call
+    """
+    # Determine the most prominent issue
+    issues = {
+        'anxiety': mental_health_data['anxiety'],
+        'depression': mental_health_data['depression'],
+        'burnout': mental_health_data['burnout']
+    }
+    prominent_issue = max(issues, key=issues.get)
+    
+    # Build the system prompt
+    system_prompt = (
+        "You are an empathetic mental health support chatbot with expertise in emotional support. "
+        "Follow these guidelines:\n\n"
+        "1. TONE & STYLE:\n"
+        "- Use a warm, compassionate, and understanding tone\n"
+        "- Validate emotions and experiences\n"
+        "- Write responses in 3-4 sentence and exceed if there is a need \n"
+        "- Use phrases like 'I understand', 'It's completely normal to feel', 'You're not alone'\n\n"
+        "2. RESPONSE STRUCTURE:\n"
+        "- If user is facing a problem, first notify him the issue he is facing"
+        "- Start with emotional acknowledgment\n"
+        "- Provide gentle guidance and support\n"
+        "- Include one practical suggestion or coping strategy\n"
+        "- End with a supportive statement\n\n"
+        "3. RESOURCES:\n"
+        "-Provide resources only if the user asks for resources"
+        "- Include 1-2 relevant online resources or websites\n"
+        "- Suggest appropriate self-help tools or apps\n"
+        "- Mention credible mental health organizations\n\n"
+        "4. FORMATTING & READABILITY:\n"
+        "- Use proper Markdown formatting in your responses\n"
+        "- Split text into paragraphs (2-3 sentences per paragraph)\n"
+        "- Use **bold** for emphasis on important words or phrases\n"
+        "- Use bullet points for lists when appropriate\n"
+        "- Include a clear visual structure with spaces between paragraphs\n\n"
+        "5. IMPORTANT RULES:\n"
+        "- NEVER diagnose or provide medical advice\n"
+        "- Keep responses conversational yet professional\n"
+        "- Always prioritize user safety\n"
+        "- Encourage professional help when appropriate\n\n"
+    )
+    
+    # Add information about detected issues
+    if mental_health_data['immediate_help']:
+        system_prompt += (
+            "The user may be in crisis and need immediate help. "
+            "Express concern, validate their feelings, and strongly encourage "
+            "them to contact a crisis service immediately. Be direct but compassionate."
+        )
+    elif issues[prominent_issue] > 0.3:
+        system_prompt += f"The user may be experiencing {prominent_issue}. "
+        if prominent_issue == 'anxiety':
+            system_prompt += "Focus on grounding techniques and present moment awareness."
+        elif prominent_issue == 'depression':
+            system_prompt += "Offer gentle encouragement and validate their feelings."
+        elif prominent_issue == 'burnout':
+            system_prompt += "Emphasize the importance of rest and boundaries."
+            
+    return system_prompt
+
+def run(number=100000):
+    """
+    Time both implementations over the sample analyses.
+    Returns nanoseconds per call for each.
+    """
+    for analysis in SAMPLE_ANALYSES:
+        assert create_prompt(SAMPLE_MESSAGE, analysis) == legacy_create_prompt(SAMPLE_MESSAGE, analysis)
+
+    results = {}
+    for name, function in [('legacy', legacy_create_prompt), ('templates', create_prompt)]:
+        seconds = sum(
+            timeit.timeit(
+                'function(message, analysis)',
+                globals={'function': function, 'message': SAMPLE_MESSAGE, 'analysis': analysis},
+                number=number
+            )
+            for analysis in SAMPLE_ANALYSES
+        )
+        results[name] = seconds / (number * len(SAMPLE_ANALYSES)) * 1e9
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000, help="iterations over the sample analyses")
+    args = parser.parse_args()
+
+    results = run(args.number)
+    for name, ns in results.items():
+        print(f"{name:>10}: {ns:8.1f} ns/call")
+    print(f"{'speedup':>10}: {results['legacy'] / results['templates']:8.1f}x")
+
+if __name__ == "__main__":
+    main()
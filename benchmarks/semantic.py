@@ -0,0 +1,151 @@
+"""
+Semantic Benchmark - Per-message latency of the semantic classifier
+against a latency budget, and how many paraphrased concerns it catches
+that the keyword lists miss, against idioms that should not be flagged
+
+Usage:
+    python -m benchmarks.semantic [--rounds 200] [--budget-ms 5]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.mental_health_utils import combine_scores, detect_by_keywords, get_concern_level
+from utils.semantic_classifier import SemanticClassifier
+
+# Held-out concerns: not in utils/semantic_exemplars.json and using no
+# keyword from the lists
+PARAPHRASES = [
+    ("my stomach is in knots before every exam", 'anxiety'),
+    ("I lie awake replaying every conversation I had", 'anxiety'),
+    ("what if it all goes wrong tomorrow, my brain won't switch off", 'anxiety'),
+    ("I haven't laughed in weeks", 'depression'),
+    ("the days blur together and none of it matters", 'depression'),
+    ("I stopped answering my friends because I can't face anyone", 'depression'),
+    ("I'm answering emails at midnight again and I'm running on fumes", 'burnout'),
+    ("every new project lands on my desk and I can't catch my breath", 'burnout'),
+    ("I keep thinking everyone would be happier if I were gone", 'suicidal'),
+    ("I've been giving away my things and saying goodbye", 'suicidal'),
+    ("I wish I could fall asleep and not wake up", 'suicidal'),
+    ("I have a plan to end it tonight", 'suicidal'),
+]
+
+# Crisis messages with no suicidal keyword that must be rated critical,
+# so they get crisis resources
+REQUIRED_CRISIS = [
+    "I don't want to be alive anymore",
+    "I want to sleep and never wake up",
+    "everyone would be better off without me",
+    "I can't see the point anymore",
+    "my family would be better off without me",
+    "I just don't want to exist anymore",
+    "I don't see any reason to keep living",
+    "I've been thinking about how to end things",
+]
+
+# Everyday messages, many with idioms that read like a concern word for word
+ORDINARY = [
+    "this meeting is killing me",
+    "I'm dead tired after that hike",
+    "no point arguing with my brother about football",
+    "I don't see the point in arguing",
+    "I can't see the point of this meeting",
+    "my phone is dead and I want to sleep",
+    "my laptop died in the middle of my presentation",
+    "I could murder a pizza right now",
+    "ugh, I want to die of embarrassment",
+    "this commute is the death of me",
+    "I'm going to disappear for the weekend, off to the mountains",
+    "there's no way out of this parking garage",
+    "nobody showed up to my party lol",
+    "what's a good book to read",
+    "how are you today",
+]
+
+def classify(classifier, message):
+    """
+    Hybrid-mode analysis of a message with the given classifier
+    """
+    scores, crisis = classifier.scores(message)
+    return combine_scores(detect_by_keywords(message), scores, crisis)
+
+def concerned(result):
+    return get_concern_level(result) != "low"
+
+def critical(result):
+    return get_concern_level(result) == "critical"
+
+def run(rounds=200):
+    """
+    Return cold (uncached) and warm (cached) latency percentiles in
+    milliseconds, plus recall and false positives of keyword and hybrid
+    detection. Also returns the required crisis messages that were not
+    rated critical.
+    """
+    with tempfile.TemporaryDirectory() as index_dir:
+        started = time.perf_counter()
+        classifier = SemanticClassifier(index_dir=index_dir, cache_size=4096)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        messages = [message for message, _ in PARAPHRASES] + REQUIRED_CRISIS + ORDINARY
+        cold = []
+        for round_number in range(rounds):
+            for message in messages:
+                # A unique suffix defeats the embedding cache
+                text = f"{message} {round_number}"
+                started = time.perf_counter()
+                classifier.scores(text)
+                cold.append(time.perf_counter() - started)
+        warm = []
+        for _ in range(rounds):
+            for message in messages:
+                started = time.perf_counter()
+                classifier.scores(message)
+                warm.append(time.perf_counter() - started)
+
+        hybrid = {message: classify(classifier, message) for message in messages}
+
+    keyword = {message: detect_by_keywords(message) for message in messages}
+    cold_ms = np.array(cold) * 1000
+    warm_ms = np.array(warm) * 1000
+    missed = [message for message in REQUIRED_CRISIS if not critical(hybrid[message])]
+    return {
+        'index_build_ms': build_ms,
+        'cold_p50_ms': float(np.percentile(cold_ms, 50)),
+        'cold_p99_ms': float(np.percentile(cold_ms, 99)),
+        'warm_p50_ms': float(np.percentile(warm_ms, 50)),
+        'warm_p99_ms': float(np.percentile(warm_ms, 99)),
+        'keyword_recall': sum(concerned(keyword[message]) for message, _ in PARAPHRASES) / len(PARAPHRASES),
+        'hybrid_recall': sum(concerned(hybrid[message]) for message, _ in PARAPHRASES) / len(PARAPHRASES),
+        'keyword_false_positives': sum(concerned(keyword[message]) for message in ORDINARY),
+        'required_crisis_critical': (len(REQUIRED_CRISIS) - len(missed)) / len(REQUIRED_CRISIS),
+        'hybrid_false_positives': sum(concerned(hybrid[message]) for message in ORDINARY),
+        'hybrid_false_critical': sum(critical(hybrid[message]) for message in ORDINARY),
+        'hybrid_false_crisis': sum(hybrid[message]['immediate_help'] for message in ORDINARY),
+        'ordinary_messages': len(ORDINARY),
+    }, missed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200, help="passes over the sample messages")
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="per-message p99 latency budget")
+    args = parser.parse_args()
+
+    print(f"embedder: {os.getenv('SEMANTIC_EMBEDDING_MODEL') or 'hashed n-grams'}")
+    results, missed = run(args.rounds)
+    for name, value in results.items():
+        print(f"{name:>26}: {value:10.3f}")
+    for message in missed:
+        print(f"required crisis message not rated critical: {message!r}")
+
+    within = results['cold_p99_ms'] <= args.budget_ms
+    print(f"cold p99 {'within' if within else 'OVER'} the {args.budget_ms} ms budget")
+    if not within or missed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
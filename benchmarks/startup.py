@@ -0,0 +1,72 @@
+"""
+Startup Benchmark - Measures import-to-first-request time for app.py
+
+Each run starts a fresh interpreter, imports the app, and serves the home
+page and a first chat message through Flask's test client. The API key is
+blanked so the run never touches the network.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--eager]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter and prints its timings as JSON
+_CHILD_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+home = time.perf_counter()
+client.post('/api/chat', json={'message': 'I feel anxious about work'})
+chat = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_page_ms': (home - imported) * 1000,
+    'first_chat_ms': (chat - home) * 1000,
+    'total_ms': (chat - start) * 1000
+}))
+"""
+
+def run_once(eager=False):
+    """
+    Start one interpreter and return its timings
+    """
+    env = dict(os.environ)
+    env["GOOGLE_API_KEY"] = ""
+    env["LAZY_INIT"] = "False" if eager else "True"
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHILD_SCRIPT],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    # The app prints warnings to stdout; the timings are the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run(runs=5, eager=False):
+    """
+    Run the benchmark and return the median of each timing
+    """
+    samples = [run_once(eager) for _ in range(runs)]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to start")
+    parser.add_argument("--eager", action="store_true", help="run with LAZY_INIT=False")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.eager)
+    for key, value in results.items():
+        print(f"{key:>14}: {value:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
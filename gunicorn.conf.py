@@ -0,0 +1,31 @@
+"""
+Gunicorn settings: the app is imported once in the master and the workers
+are forked from it, sharing its read-only data (see utils/lifecycle.py)
+
+    gunicorn app:app
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+The worker count comes from WEB_CONCURRENCY or --workers.
+"""
+
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+preload_app = True
+
+# Objects made while the app is imported stay alive for good; with the
+# collector off until preload() freezes them they are packed together
+# instead of being spread among the holes freed objects would leave.
+# preload() turns it back on in the master, post_fork() in each worker.
+gc.disable()
+
+
+def when_ready(server):
+    # Called in the master after the app is loaded, before any worker is forked
+    from utils.lifecycle import preload
+    preload()
+
+def post_fork(server, worker):
+    from utils.lifecycle import post_fork as reinitialize
+    reinitialize()
@@ -0,0 +1,264 @@
+"""
+Score Transcripts - Offline re-scoring of message dumps
+
+Reads a JSONL or CSV transcript as a stream, scores each message with
+detect_mental_health_issues and get_concern_level on a pool of worker
+processes and writes JSONL in input order: each input record with an
+"analysis" object and a "concern_level" added. Memory stays bounded
+however large the input is, and an interrupted run picks up from its
+last checkpoint.
+
+Usage:
+    python score_transcripts.py INPUT OUTPUT [--format jsonl|csv]
+        [--message-field message] [--workers N] [--chunk-size 1000]
+        [--vectorized] [--restart]
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from utils.mental_health_utils import CATEGORIES, detect_mental_health_issues, get_concern_level
+
+# How often progress is printed and the checkpoint saved, in seconds
+PROGRESS_INTERVAL_SECONDS = 5.0
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+
+
+def read_jsonl_chunks(f, chunk_size):
+    """
+    Yield (raw lines, end offset) from a binary file. Lines are decoded by
+    the workers, so parsing runs in parallel too.
+    """
+    chunk = []
+    offset = f.tell()
+    for line in f:
+        offset += len(line)
+        if line.strip():
+            chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk, offset
+            chunk = []
+    if chunk:
+        yield chunk, offset
+
+def read_csv_chunks(f, chunk_size, header):
+    """
+    Yield (row dicts, end offset) from a binary file positioned after the
+    header. Quoted fields may span lines, so rows are parsed here.
+    """
+    position = [f.tell()]
+
+    def lines():
+        for line in f:
+            position[0] += len(line)
+            yield line.decode("utf-8")
+
+    chunk = []
+    for row in csv.reader(lines()):
+        chunk.append(dict(zip(header, row)))
+        if len(chunk) >= chunk_size:
+            # The reader has consumed exactly the lines of the rows returned
+            yield chunk, position[0]
+            chunk = []
+    if chunk:
+        yield chunk, position[0]
+
+def read_csv_header(path):
+    with open(path, "rb") as f:
+        line = f.readline()
+        return next(csv.reader([line.decode("utf-8-sig")])), len(line)
+
+
+def score_record(record, message_field, scores=None):
+    if scores is None:
+        message = record.get(message_field)
+        scores = detect_mental_health_issues(message if isinstance(message, str) else "")
+    record['analysis'] = scores
+    record['concern_level'] = get_concern_level(scores)
+    return json.dumps(record, ensure_ascii=False)
+
+def score_chunk(task):
+    """
+    Worker: parse and score one chunk, returning the encoded output lines
+    """
+    items, is_json, message_field, vectorized = task
+    records = []
+    for item in items:
+        if not is_json:
+            records.append(item)
+            continue
+        try:
+            record = json.loads(item)
+            records.append(record if isinstance(record, dict) else {'value': record})
+        except ValueError as e:
+            # Keep one output line per input line so the output stays aligned
+            records.append(f"Invalid JSON: {e}")
+
+    columns = None
+    if vectorized:
+        from utils.batch_analysis import analyze_messages
+        columns = analyze_messages(record.get(message_field) if isinstance(record, dict) else None
+                                   for record in records)
+    lines = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            lines.append(json.dumps({'error': record}))
+        elif columns is not None:
+            scores = {key: float(columns[key][i]) for key in CATEGORIES}
+            scores['immediate_help'] = bool(columns['immediate_help'][i])
+            lines.append(score_record(record, message_field, scores))
+        else:
+            lines.append(score_record(record, message_field))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def init_worker():
+    # Workers should stop with the parent on Ctrl+C, not print a traceback each
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def load_checkpoint(path, input_path):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        print(f"Ignoring checkpoint {path}: it was written for {checkpoint.get('input')}", file=sys.stderr)
+        return None
+    return checkpoint
+
+def save_checkpoint(path, checkpoint, output):
+    """
+    Make the output durable first, then atomically record how far it got
+    """
+    output.flush()
+    os.fsync(output.fileno())
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
+
+
+class Progress:
+    def __init__(self, total_bytes, start_offset, start_records):
+        self.total_bytes = total_bytes
+        self.start_offset = start_offset
+        self.start_records = start_records
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def report(self, offset, records, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < PROGRESS_INTERVAL_SECONDS:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = (records - self.start_records) / elapsed
+        byte_rate = (offset - self.start_offset) / elapsed
+        percent = 100.0 * offset / self.total_bytes if self.total_bytes else 100.0
+        eta = (self.total_bytes - offset) / byte_rate if byte_rate > 0 else 0
+        print(f"{records:,} records  {percent:5.1f}%  {rate:,.0f} records/s  ETA {eta:,.0f}s", file=sys.stderr)
+
+
+def score_file(input_path, output_path, input_format="jsonl", message_field="message", workers=None,
+               chunk_size=1000, checkpoint_path=None, restart=False, vectorized=False):
+    """
+    Score input_path into output_path. Returns the number of records
+    written, including those from earlier runs.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    workers = workers or os.cpu_count() or 1
+    is_json = input_format == "jsonl"
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path, input_path)
+    if checkpoint is None:
+        checkpoint = {'input': os.path.abspath(input_path), 'input_offset': 0, 'output_size': 0, 'records': 0}
+    elif checkpoint['records']:
+        print(f"Resuming after {checkpoint['records']:,} records", file=sys.stderr)
+
+    header = None
+    if not is_json:
+        header, header_size = read_csv_header(input_path)
+        checkpoint['input_offset'] = max(checkpoint['input_offset'], header_size)
+
+    total_bytes = os.path.getsize(input_path)
+    progress = Progress(total_bytes, checkpoint['input_offset'], checkpoint['records'])
+    # Chunks submitted but not yet written; bounds memory to a few chunks per worker
+    max_pending = workers * 2
+    pending = deque()
+    last_checkpoint = time.monotonic()
+
+    with open(input_path, "rb") as source, open(output_path, "ab") as output, \
+            multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        # Drop anything written after the last checkpoint
+        output.truncate(checkpoint['output_size'])
+        output.seek(checkpoint['output_size'])
+        source.seek(checkpoint['input_offset'])
+        if is_json:
+            chunks = read_jsonl_chunks(source, chunk_size)
+        else:
+            chunks = read_csv_chunks(source, chunk_size, header)
+
+        def write_oldest():
+            result, count, end_offset = pending.popleft()
+            output.write(result.get())
+            checkpoint['records'] += count
+            checkpoint['input_offset'] = end_offset
+            checkpoint['output_size'] = output.tell()
+
+        try:
+            for items, end_offset in chunks:
+                pending.append((pool.apply_async(score_chunk, ((items, is_json, message_field, vectorized),)),
+                                len(items), end_offset))
+                while len(pending) >= max_pending or (pending and pending[0][0].ready()):
+                    write_oldest()
+                progress.report(checkpoint['input_offset'], checkpoint['records'])
+                if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                    save_checkpoint(checkpoint_path, checkpoint, output)
+                    last_checkpoint = time.monotonic()
+
+            while pending:
+                write_oldest()
+        finally:
+            # Record what was written, so an interrupted run resumes from here
+            save_checkpoint(checkpoint_path, checkpoint, output)
+
+    progress.report(checkpoint['input_offset'], checkpoint['records'], force=True)
+    return checkpoint['records']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL or CSV transcript")
+    parser.add_argument("output", help="scored JSONL file (appended to when resuming)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the extension)")
+    parser.add_argument("--message-field", default="message", help="field holding the message text")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="records per task")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore any checkpoint and start over")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="score each chunk with the vectorized keyword scorer (keyword mode only)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    input_format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    try:
+        records = score_file(args.input, args.output, input_format, args.message_field, args.workers,
+                             args.chunk_size, args.checkpoint, args.restart, args.vectorized)
+    except KeyboardInterrupt:
+        print("Interrupted - run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
+    print(f"Scored {records:,} records into {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -132,7 +132,16 @@ document.addEventListener("DOMContentLoaded", () => {
     // Show typing indicator
     showTypingIndicator();
 
-    // Send message to server
+    // Stream the reply when the browser supports it
+    if (window.ReadableStream && window.TextDecoder) {
+      streamReply(message);
+    } else {
+      requestReply(message);
+    }
+  }
+
+  // Request the whole reply as a single JSON response
+  function requestReply(message) {
     fetch("/api/chat", {
       method: "POST",
       headers: {
@@ -210,6 +219,130 @@ document.addEventListener("DOMContentLoaded", () => {
       });
   }
 
+  // Stream the reply token by token using Server-Sent Events
+  function streamReply(message) {
+    let streamingDiv = null;
+    let streamingContent = null;
+    let replyText = "";
+    let finalData = null;
+    let crisisShown = false;
+
+    const renderTokens = (text) => {
+      if (!streamingDiv) {
+        // Replace the typing indicator with the reply as soon as it starts
+        removeTypingIndicator();
+        streamingDiv = document.createElement("div");
+        streamingDiv.className = "message bot-message";
+        streamingContent = document.createElement("div");
+        streamingContent.className = "message-content";
+        streamingDiv.appendChild(streamingContent);
+        chatMessages.appendChild(streamingDiv);
+      }
+      replyText += text;
+      streamingContent.innerHTML = marked.parse(replyText);
+      scrollToBottom();
+    };
+
+    const handleEvent = (rawEvent) => {
+      let eventName = "message";
+      let dataText = "";
+      rawEvent.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) {
+          eventName = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          dataText += line.slice(5).trim();
+        }
+      });
+      if (!dataText) return;
+
+      const data = JSON.parse(dataText);
+      if (eventName === "crisis") {
+        // Show crisis support right away; a follow-up reply may stream after it
+        removeTypingIndicator();
+        appendMessage(data.message, "bot");
+        if (data.resources) {
+          displayResources(data.resources);
+        }
+        if (data.follow_up) {
+          showTypingIndicator();
+        }
+        crisisShown = true;
+        scrollToBottom();
+      } else if (eventName === "token") {
+        renderTokens(data.text);
+      } else if (eventName === "done" || eventName === "error") {
+        finalData = data;
+      }
+    };
+
+    fetch("/api/chat/stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      body: JSON.stringify({ message }),
+    })
+      .then((response) => {
+        const contentType = response.headers.get("content-type") || "";
+        if (!response.ok || !response.body || !contentType.includes("text/event-stream")) {
+          throw new Error("Streaming not available");
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        const pump = () =>
+          reader.read().then(({ done, value }) => {
+            if (value) {
+              buffer += decoder.decode(value, { stream: true });
+              const events = buffer.split("\n\n");
+              buffer = events.pop();
+              events.forEach(handleEvent);
+            }
+            if (!done) return pump();
+            if (buffer.trim()) handleEvent(buffer);
+          });
+
+        return pump();
+      })
+      .then(() => {
+        removeTypingIndicator();
+
+        // Re-render the finished reply with reactions and suggestions
+        if (streamingDiv) {
+          streamingDiv.remove();
+        }
+        if (crisisShown && !replyText) {
+          // The crisis message already answered and no follow-up came
+          return;
+        }
+        const finalText =
+          replyText || (finalData && finalData.message) ||
+          "Sorry, I encountered an error. Please try again.";
+        appendMessage(finalText, "bot");
+
+        if (finalData && finalData.resources) {
+          displayResources(finalData.resources);
+        }
+        if (finalData && finalData.exercise) {
+          displayExercise(finalData.exercise);
+        }
+
+        scrollToBottom();
+      })
+      .catch((error) => {
+        console.error("Streaming error:", error);
+        if (streamingDiv || crisisShown) {
+          // Keep the partial reply rather than sending the message twice
+          removeTypingIndicator();
+          return;
+        }
+        requestReply(message);
+      });
+  }
+
   // Append a message to the chat
   function appendMessage(content, sender) {
     const messageDiv = document.createElement("div");
@@ -360,6 +493,9 @@ document.addEventListener("DOMContentLoaded", () => {
   function removeTypingIndicator() {
     const typingIndicator = document.getElementById("typingIndicator");
     if (typingIndicator) {
+      // Drop the id now so a new indicator shown during the fade is found next time
+      typingIndicator.removeAttribute("id");
+
       // Add fade out animation
       typingIndicator.style.opacity = "0";
       typingIndicator.style.transform = "translateY(10px)";
@@ -0,0 +1,257 @@
+"""
+Admission Control - Token-bucket rate limits per session and per client
+address, and a cap on in-flight model calls, so one noisy client can't
+use up the workers or the model quota
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Sustained requests per minute and burst size for each session...
+RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", 20))
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", 10))
+# ...and for each client address, which may be shared by several users
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", 120))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", 30))
+# Buckets tracked by the in-memory backend before the least recent is dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Database shared by all worker processes with the sqlite backend
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.db")
+# Model calls allowed in flight at once in each process (0 disables the cap)
+MAX_INFLIGHT_MODEL_CALLS = int(os.getenv("MAX_INFLIGHT_MODEL_CALLS", 32))
+
+
+class InMemoryRateLimiter:
+    """
+    Token buckets held in this process. A bucket refills at rate tokens
+    per second up to burst, and each request takes one token.
+    """
+
+    def __init__(self, name, rate, burst, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+        Take a token. Returns 0 if the request is allowed, otherwise the
+        number of seconds until a token will be available.
+        """
+        key = f"{self.name}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def metrics(self):
+        with self._lock:
+            return {'keys': len(self._buckets)}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+_SQL_CREATE_BUCKET = "INSERT OR IGNORE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)"
+# Refill and take a token in one statement; no row changes if the bucket is empty
+_SQL_TAKE_TOKEN = (
+    "UPDATE buckets SET tokens = min(:burst, tokens + (:now - updated) * :rate) - 1, updated = :now "
+    "WHERE key = :key AND min(:burst, tokens + (:now - updated) * :rate) >= 1"
+)
+_SQL_SELECT_BUCKET = "SELECT tokens, updated FROM buckets WHERE key = ?"
+# Keys of one limiter sort between "name:" and "name;"
+_SQL_PRUNE = "DELETE FROM buckets WHERE key > ? AND key < ? AND updated < ?"
+
+
+class SQLiteRateLimiter:
+    """
+    Token buckets in a local SQLite database, so all worker processes on
+    the host share one limit per key. Each check is a single short write
+    transaction.
+    """
+
+    def __init__(self, name, rate, burst, path=RATE_LIMIT_DB_PATH):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self._local = threading.local()
+        self._last_prune = 0.0
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def acquire(self, key):
+        key = f"{self.name}:{key}"
+        # Wall-clock time, since the buckets are shared between processes
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(_SQL_CREATE_BUCKET, (key, self.burst, now))
+            taken = connection.execute(
+                _SQL_TAKE_TOKEN, {'key': key, 'now': now, 'rate': self.rate, 'burst': self.burst}
+            ).rowcount
+            if taken:
+                wait = 0.0
+            else:
+                tokens, updated = connection.execute(_SQL_SELECT_BUCKET, (key,)).fetchone()
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                wait = max((1 - tokens) / self.rate, 0.001)
+
+        # A bucket idle long enough to be full again can be forgotten
+        if now - self._last_prune >= 60:
+            self._last_prune = now
+            with self._connection() as connection:
+                connection.execute(_SQL_PRUNE, (f"{self.name}:", f"{self.name};", now - self.burst / self.rate))
+        return wait
+
+    def metrics(self):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM buckets WHERE key > ? AND key < ?", (f"{self.name}:", f"{self.name};")
+        ).fetchone()
+        return {'keys': row[0]}
+
+
+class ModelCallsExhausted(Exception):
+    """Raised instead of starting a model call when the process is at its cap"""
+
+
+class ModelCallLimiter:
+    """
+    Counts model calls in flight and refuses new ones beyond the cap
+    instead of queueing them. Priority calls are always let through.
+    """
+
+    def __init__(self, max_in_flight=MAX_INFLIGHT_MODEL_CALLS):
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_acquire(self, priority=False):
+        with self._lock:
+            if not priority and self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def saturated(self):
+        return bool(self.max_in_flight) and self._in_flight >= self.max_in_flight
+
+    def metrics(self):
+        with self._lock:
+            return {'in_flight': self._in_flight, 'max_in_flight': self.max_in_flight, 'rejected': self.rejected}
+
+
+class AdmissionController:
+    """
+    Decides whether a chat request may proceed. Crisis messages are always
+    admitted, whatever the limits.
+    """
+
+    def __init__(self, session_limiter, ip_limiter, model_calls, shed_mode="fallback"):
+        self.session_limiter = session_limiter
+        self.ip_limiter = ip_limiter
+        self.model_calls = model_calls
+        # What to do when the model-call cap is reached: "fallback" answers
+        # with a canned reply, "429" asks the client to retry
+        self.shed_mode = shed_mode
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+        self.crisis_admitted = 0
+
+    def check_rate(self, session_id, client_address, crisis=False):
+        """
+        Take a token from the session's and the address's buckets. Returns
+        0 if the request may proceed, otherwise seconds to wait.
+        """
+        if crisis:
+            with self._lock:
+                self.crisis_admitted += 1
+            return 0.0
+        wait = 0.0
+        if session_id:
+            wait = self.session_limiter.acquire(session_id)
+        if not wait and client_address:
+            wait = self.ip_limiter.acquire(client_address)
+        if wait:
+            with self._lock:
+                self.rate_limited += 1
+        return wait
+
+    def reject_overloaded(self, crisis=False):
+        """
+        True if the request should get a 429 because the model-call cap is
+        reached. In fallback mode the model call itself is refused later
+        and answered with a fallback reply instead.
+        """
+        return self.shed_mode == "429" and not crisis and self.model_calls.saturated()
+
+    def metrics(self):
+        values = {'rate_limited': self.rate_limited, 'crisis_admitted': self.crisis_admitted}
+        for key, value in self.model_calls.metrics().items():
+            values[f"model_calls_{key}"] = value
+        for key, value in self.session_limiter.metrics().items():
+            values[f"session_buckets_{key}"] = value
+        for key, value in self.ip_limiter.metrics().items():
+            values[f"ip_buckets_{key}"] = value
+        return values
+
+
+# Shared by every model call in this process (see utils/response_generator.py)
+model_call_limiter = ModelCallLimiter()
+
+# Registered bucket backends, selected with RATE_LIMIT_BACKEND
+RATE_LIMIT_BACKENDS = {
+    'memory': InMemoryRateLimiter,
+    'sqlite': SQLiteRateLimiter
+}
+
+def create_admission_controller(backend=None):
+    """
+    Build the admission controller from the environment. RATE_LIMIT_BACKEND
+    is memory (per process) or sqlite (shared by the workers on a host);
+    SHED_MODE is fallback or 429.
+    """
+    backend = backend or os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend not in RATE_LIMIT_BACKENDS:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+    factory = RATE_LIMIT_BACKENDS[backend]
+    return AdmissionController(
+        factory("session", RATE_LIMIT_SESSION_PER_MINUTE / 60, RATE_LIMIT_SESSION_BURST),
+        factory("ip", RATE_LIMIT_IP_PER_MINUTE / 60, RATE_LIMIT_IP_BURST),
+        model_call_limiter,
+        os.getenv("SHED_MODE", "fallback")
+    )
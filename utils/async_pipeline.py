@@ -0,0 +1,103 @@
+"""
+Async Pipeline - Concurrency limits and backpressure for the asyncio
+serving path (see asgi.py)
+"""
+
+import asyncio
+import os
+
+# How many model calls may be awaited at once on one process
+MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", 64))
+# How many requests may queue for a slot before new ones are rejected
+MAX_PENDING = int(os.getenv("ASYNC_MAX_PENDING", 256))
+# How long a queued request waits for a slot before it is rejected
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASYNC_QUEUE_TIMEOUT", 10))
+# Slots reserved for crisis requests, which never wait on normal traffic
+PRIORITY_CONCURRENCY = int(os.getenv("ASYNC_PRIORITY_CONCURRENCY", 16))
+
+
+class ServerOverloaded(Exception):
+    """
+    Raised when a request cannot get a slot in time or the queue is full
+    """
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight work on an event loop and rejects requests early once
+    too many are already waiting, instead of letting the queue grow.
+    Priority requests have their own slots and are never rejected.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_pending=MAX_PENDING,
+                 queue_timeout=QUEUE_TIMEOUT_SECONDS, priority_concurrency=PRIORITY_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.priority_concurrency = priority_concurrency
+        self._semaphore = None
+        self._priority_semaphore = None
+        self._priority_in_flight = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def _get_semaphore(self):
+        # Created on first use so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, coroutine_function, *args, priority=False):
+        """
+        Await coroutine_function(*args) once a slot is free.
+        Raises ServerOverloaded when the request should be shed.
+        """
+        if priority:
+            return await self._run_priority(coroutine_function, *args)
+
+        semaphore = self._get_semaphore()
+        # Counted synchronously so a burst arriving in one loop tick is seen
+        if self._in_flight + self._waiting >= self.max_concurrency + self.max_pending:
+            self._rejected += 1
+            raise ServerOverloaded("Too many requests are waiting")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise ServerOverloaded("Timed out waiting for a free slot")
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            return await coroutine_function(*args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            semaphore.release()
+
+    async def _run_priority(self, coroutine_function, *args):
+        if self._priority_semaphore is None:
+            self._priority_semaphore = asyncio.Semaphore(self.priority_concurrency)
+        async with self._priority_semaphore:
+            self._priority_in_flight += 1
+            try:
+                return await coroutine_function(*args)
+            finally:
+                self._priority_in_flight -= 1
+                self._completed += 1
+
+    def metrics(self):
+        return {
+            'in_flight': self._in_flight,
+            'priority_in_flight': self._priority_in_flight,
+            'waiting': self._waiting,
+            'rejected': self._rejected,
+            'completed': self._completed,
+            'max_concurrency': self.max_concurrency,
+            'max_pending': self.max_pending
+        }
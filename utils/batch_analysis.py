@@ -0,0 +1,224 @@
+"""
+Batch Analysis - Vectorized scoring of many messages at once for offline
+triage and re-scoring of transcripts
+"""
+
+import re
+from collections import namedtuple
+from itertools import repeat
+
+import numpy as np
+
+from utils.keyword_matcher import TOKEN_PATTERN, normalize_text
+from utils.mental_health_utils import KEYWORD_MATCHER
+
+SCORE_COLUMNS = ['anxiety', 'depression', 'burnout', 'suicidal']
+
+CONCERN_LEVELS = np.array(['low', 'moderate', 'high', 'critical'], dtype=object)
+
+# Separates messages inside the joined corpus; it is tokenized as its own token
+_SEPARATOR = "\x00"
+_CORPUS_PATTERN = re.compile(TOKEN_PATTERN.pattern + "|" + _SEPARATOR)
+
+# Sparse (CSR) term-count matrix: rows are messages, columns are lexicon terms
+TermCountMatrix = namedtuple('TermCountMatrix', ['data', 'indices', 'indptr', 'shape'])
+
+
+class BatchScorer:
+    """
+    Scores a batch of messages against the lexicons of a KeywordMatcher.
+
+    The lexicon is compiled into a token trie whose transitions are stored
+    as a sorted array, so every token position of the whole batch advances
+    through the trie in one vectorized step per term length.
+    """
+
+    def __init__(self, matcher):
+        self.categories = matcher.categories
+        self.terms = [tokens for tokens, _ in matcher.terms]
+
+        # Vocabulary of every token used by a term; other tokens share one id
+        self.vocabulary = {}
+        for tokens in self.terms:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+        self._unknown_id = len(self.vocabulary)
+        self._separator_id = self._unknown_id + 1
+        self._base = self._unknown_id + 2
+
+        # Trie over token ids; node 0 is the root
+        children = [{}]
+        terminal = {}
+        for term_id, tokens in enumerate(self.terms):
+            node = 0
+            for token in tokens:
+                token_id = self.vocabulary[token]
+                if token_id not in children[node]:
+                    children[node][token_id] = len(children)
+                    children.append({})
+                node = children[node][token_id]
+            terminal[node] = term_id
+
+        keys = []
+        targets = []
+        for node, edges in enumerate(children):
+            for token_id, child in edges.items():
+                keys.append(node * self._base + token_id)
+                targets.append(child)
+        order = np.argsort(keys)
+        self._transition_keys = np.asarray(keys, dtype=np.int64)[order]
+        self._transition_targets = np.asarray(targets, dtype=np.int64)[order]
+
+        self._node_term = np.full(len(children), -1, dtype=np.int64)
+        for node, term_id in terminal.items():
+            self._node_term[node] = term_id
+        self._max_term_length = max((len(tokens) for tokens in self.terms), default=0)
+
+        # Term x category incidence matrix
+        self.incidence = np.zeros((len(self.terms), len(self.categories)))
+        category_index = {category: i for i, category in enumerate(self.categories)}
+        for term_id, (_, categories) in enumerate(matcher.terms):
+            for category in categories:
+                self.incidence[term_id, category_index[category]] = 1.0
+
+    def _token_ids(self, messages):
+        """
+        Tokenize the whole batch at once.
+        Returns (token_ids, message_index) for every word token.
+        """
+        corpus = _SEPARATOR.join(messages)
+        if corpus.count(_SEPARATOR) != len(messages) - 1:
+            # A message contained the separator itself
+            corpus = _SEPARATOR.join(message.replace(_SEPARATOR, " ") for message in messages)
+
+        tokens = _CORPUS_PATTERN.findall(normalize_text(corpus))
+        lookup = dict(self.vocabulary)
+        lookup[_SEPARATOR] = self._separator_id
+        ids = np.fromiter(map(lookup.get, tokens, repeat(self._unknown_id)),
+                          dtype=np.int64, count=len(tokens))
+
+        is_separator = ids == self._separator_id
+        message_index = np.cumsum(is_separator)
+        is_word = ~is_separator
+        return ids[is_word], message_index[is_word]
+
+    def term_counts(self, messages):
+        """
+        Build the sparse term-count matrix for a list of messages.
+        Returns (TermCountMatrix, word_counts).
+        """
+        n_messages = len(messages)
+        n_terms = len(self.terms)
+        if n_messages == 0:
+            empty = TermCountMatrix(np.zeros(0), np.zeros(0, dtype=np.int64),
+                                    np.zeros(1, dtype=np.int64), (0, n_terms))
+            return empty, np.zeros(0, dtype=np.int64)
+
+        ids, message_index = self._token_ids(messages)
+        word_counts = np.bincount(message_index, minlength=n_messages)
+
+        # Advance every start position through the trie one token at a time
+        starts = np.arange(len(ids))
+        nodes = np.zeros(len(ids), dtype=np.int64)
+        match_starts = []
+        match_terms = []
+        for depth in range(self._max_term_length):
+            positions = starts + depth
+            in_range = positions < len(ids)
+            starts, nodes, positions = starts[in_range], nodes[in_range], positions[in_range]
+
+            # Terms never span two messages
+            same_message = message_index[positions] == message_index[starts]
+            starts, nodes, positions = starts[same_message], nodes[same_message], positions[same_message]
+
+            keys = nodes * self._base + ids[positions]
+            slots = np.searchsorted(self._transition_keys, keys)
+            slots = np.minimum(slots, len(self._transition_keys) - 1)
+            found = self._transition_keys[slots] == keys
+            starts = starts[found]
+            nodes = self._transition_targets[slots[found]]
+            if len(starts) == 0:
+                break
+
+            term_ids = self._node_term[nodes]
+            completed = term_ids >= 0
+            match_starts.append(starts[completed])
+            match_terms.append(term_ids[completed])
+
+        if match_starts:
+            rows = message_index[np.concatenate(match_starts)]
+            cols = np.concatenate(match_terms)
+        else:
+            rows = cols = np.zeros(0, dtype=np.int64)
+
+        cells, data = np.unique(rows * n_terms + cols, return_counts=True)
+        rows, cols = cells // n_terms, cells % n_terms
+        indptr = np.searchsorted(rows, np.arange(n_messages + 1))
+        matrix = TermCountMatrix(data.astype(np.float64), cols, indptr, (n_messages, n_terms))
+        return matrix, word_counts
+
+    def category_counts(self, matrix):
+        """
+        Multiply the sparse term-count matrix by the term x category
+        incidence matrix. Returns an (n_messages, n_categories) array.
+        """
+        n_messages = matrix.shape[0]
+        rows = np.repeat(np.arange(n_messages), np.diff(matrix.indptr))
+        weights = matrix.data[:, None] * self.incidence[matrix.indices]
+        counts = np.zeros((n_messages, len(self.categories)))
+        np.add.at(counts, rows, weights)
+        return counts
+
+    def score(self, messages):
+        """
+        Score a batch of messages.
+        Returns a dictionary of columns, one array entry per message.
+        """
+        matrix, word_counts = self.term_counts(messages)
+        counts = self.category_counts(matrix)
+        column = {category: counts[:, i] for i, category in enumerate(self.categories)}
+
+        immediate_help = column['immediate_help'] > 0
+        safe_counts = np.maximum(word_counts, 1)
+
+        result = {}
+        for key in SCORE_COLUMNS:
+            result[key] = column[key] / safe_counts
+        result['suicidal'] = np.where(immediate_help, 1.0 + result['suicidal'], result['suicidal'])
+        for key in SCORE_COLUMNS:
+            result[key] = np.minimum(result[key], 1.0)
+        result['immediate_help'] = immediate_help
+        result['concern_level'] = get_concern_levels(result)
+        return result
+
+
+def get_concern_levels(scores):
+    """
+    Vectorized get_concern_level over columnar scores.
+    Returns an array of low, moderate, high, or critical.
+    """
+    max_score = np.max([scores[key] for key in SCORE_COLUMNS], axis=0)
+    critical = scores['immediate_help'] | (scores['suicidal'] > 0.3)
+    level = np.select(
+        [critical, max_score > 0.6, max_score > 0.3],
+        [3, 2, 1],
+        default=0
+    )
+    return CONCERN_LEVELS[level]
+
+
+# Built once at import time from the same lexicons as detect_mental_health_issues
+BATCH_SCORER = BatchScorer(KEYWORD_MATCHER)
+
+def analyze_messages(messages):
+    """
+    Score an iterable or array of messages in one vectorized pass.
+    Returns a dictionary of columns (anxiety, depression, burnout, suicidal,
+    immediate_help, concern_level) with one entry per message.
+    """
+    if isinstance(messages, np.ndarray):
+        messages = messages.tolist()
+    elif not isinstance(messages, list):
+        messages = list(messages)
+    messages = [message if isinstance(message, str) else "" for message in messages]
+    return BATCH_SCORER.score(messages)
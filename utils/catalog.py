@@ -0,0 +1,196 @@
+"""
+Catalog - Resource bundles and exercise pools built once, frozen and
+pre-encoded to JSON, optionally loaded (and hot-reloaded) from a data file
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+from utils import exercise_suggestions, mental_health_resources
+
+# JSON file overriding the built-in resources and exercises
+CATALOG_FILE = os.getenv("CATALOG_FILE")
+# How often the catalog file is checked for changes (0 disables reloading)
+CATALOG_RELOAD_SECONDS = float(os.getenv("CATALOG_RELOAD_SECONDS", 5))
+
+CONCERN_LEVELS = ('low', 'moderate', 'high', 'critical')
+EXERCISE_STATES = ('anxiety', 'depression', 'burnout', 'general')
+
+
+class Payload(dict):
+    """
+    Read-only dict that carries its own compact JSON encoding
+    """
+    __slots__ = ('json',)
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.json = json.dumps(self, separators=(',', ':')).encode('utf-8')
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Catalog payloads are read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (Payload, (dict(self),))
+
+
+def freeze(value):
+    """
+    Recursively convert dicts to Payloads and lists to tuples
+    """
+    if isinstance(value, dict):
+        return Payload({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def encode_json(fields):
+    """
+    Encode a flat dict as JSON bytes. The plain values are serialized in
+    one call and the pre-encoded bytes of any Payload values are spliced
+    in instead of serializing them again.
+    """
+    plain = {}
+    spliced = []
+    for key, value in fields.items():
+        if isinstance(value, Payload):
+            spliced.append(json.dumps(key).encode('utf-8') + b':' + value.json)
+        else:
+            plain[key] = value
+
+    body = json.dumps(plain, separators=(',', ':')).encode('utf-8')
+    if not spliced:
+        return body
+    separator = b'' if len(body) == 2 else b','
+    return body[:-1] + separator + b','.join(spliced) + b'}'
+
+
+class Catalog:
+    """
+    Immutable per-concern resource bundles and per-state exercise pools
+    """
+
+    def __init__(self, resources, exercises, version="builtin"):
+        for level in CONCERN_LEVELS:
+            if level not in resources:
+                raise ValueError(f"Catalog has no resources for concern level '{level}'")
+        for state in EXERCISE_STATES:
+            if not exercises.get(state):
+                raise ValueError(f"Catalog has no exercises for '{state}'")
+
+        self.version = version
+        self.resource_bundles = {
+            level: freeze({**bundle, 'type': bundle.get('type', level)})
+            for level, bundle in resources.items()
+        }
+        self.exercise_pools = {state: freeze(pool) for state, pool in exercises.items()}
+
+    def resources(self, concern_level):
+        return self.resource_bundles.get(concern_level, self.resource_bundles['low'])
+
+    def exercise(self, mental_state):
+        return random.choice(self.exercise_pools.get(mental_state, self.exercise_pools['general']))
+
+
+def builtin_catalog_data():
+    """
+    The resources and exercises defined in mental_health_resources and
+    exercise_suggestions, in catalog file format
+    """
+    exercises = exercise_suggestions
+    return {
+        'version': 'builtin',
+        'resources': {
+            level: mental_health_resources.get_resources_by_concern(level) for level in CONCERN_LEVELS
+        },
+        'exercises': {
+            'anxiety': exercises.BREATHING_EXERCISES + exercises.MINDFULNESS_EXERCISES,
+            'depression': exercises.PHYSICAL_EXERCISES + exercises.JOURNALING_EXERCISES,
+            'burnout': exercises.BREATHING_EXERCISES + exercises.PHYSICAL_EXERCISES,
+            'general': (exercises.BREATHING_EXERCISES + exercises.MINDFULNESS_EXERCISES +
+                        exercises.JOURNALING_EXERCISES + exercises.PHYSICAL_EXERCISES)
+        }
+    }
+
+def load_catalog(path=None):
+    """
+    Build a catalog from a JSON file, or from the built-in data without one
+    """
+    if path is None:
+        data = builtin_catalog_data()
+    else:
+        with open(path) as f:
+            data = json.load(f)
+    return Catalog(data['resources'], data['exercises'], data.get('version', path))
+
+
+class CatalogHolder:
+    """
+    Holds the current catalog and swaps in a new one when the data file
+    changes. Readers always see one complete catalog, old or new.
+    """
+
+    def __init__(self, path=CATALOG_FILE, reload_seconds=CATALOG_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._mtime = self._stat()
+        self.reloads = 0
+        try:
+            self.catalog = load_catalog(path)
+        except Exception as e:
+            print(f"Error loading catalog from {path}: {e} - using built-in catalog")
+            self.catalog = load_catalog()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
+    def get(self):
+        """
+        Return the current catalog, reloading it first if the file changed
+        """
+        if self.path and self.reload_seconds > 0 and time.monotonic() - self._checked_at >= self.reload_seconds:
+            self.reload_if_changed()
+        return self.catalog
+
+    def reload_if_changed(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            return self.reload()
+
+    def reload(self):
+        """
+        Load the data file again. On error the current catalog is kept.
+        """
+        try:
+            self.catalog = load_catalog(self.path)
+            self.reloads += 1
+            print(f"Loaded catalog {self.catalog.version} from {self.path}")
+            return True
+        except Exception as e:
+            print(f"Error reloading catalog from {self.path}: {e}")
+            return False
+
+
+catalog_holder = CatalogHolder()
+
+def get_catalog():
+    return catalog_holder.get()
+
+
+if __name__ == '__main__':
+    # Print the built-in catalog as a starting point for CATALOG_FILE
+    print(json.dumps(builtin_catalog_data(), indent=2))
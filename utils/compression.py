@@ -0,0 +1,72 @@
+"""
+Compression - Content-encoding negotiation and gzip/brotli compression of
+API responses
+"""
+
+import gzip
+import os
+from functools import lru_cache
+
+# Responses smaller than this are sent as-is; compressing them saves little
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+# Levels for responses compressed per request: fast rather than smallest
+GZIP_LEVEL = 5
+BROTLI_LEVEL = 4
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain')
+
+
+@lru_cache(maxsize=None)
+def get_brotli():
+    """
+    The optional brotli module, or None if it is not installed
+    """
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+def available_encodings():
+    """
+    Encodings this process can produce, most preferred first
+    """
+    return ('br', 'gzip') if get_brotli() is not None else ('gzip',)
+
+def negotiate_encoding(accept_encodings, offered=None):
+    """
+    Pick the first offered encoding the client accepts (werkzeug's
+    request.accept_encodings), or None for the identity encoding
+    """
+    for encoding in (offered if offered is not None else available_encodings()):
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return get_brotli().compress(data, quality=BROTLI_LEVEL if level is None else level)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+def compress_response(response, accept_encodings, min_bytes=COMPRESS_MIN_BYTES):
+    """
+    Compress a buffered Flask response in place if it is large enough, of
+    a text type and the client accepts a supported encoding. Streamed
+    responses (such as Server-Sent Events) are left alone.
+    """
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200 or
+            'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
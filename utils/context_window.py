@@ -0,0 +1,151 @@
+"""
+Context Window - Assembles recent conversation turns and a rolling summary
+of older ones into the prompt, under a token budget
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+
+# Token budgets for the recent turns and for the summary of older turns
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1000))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CONTEXT_SUMMARY_TOKENS", 200))
+# Sessions whose context state is kept in memory
+CONTEXT_CACHE_SESSIONS = int(os.getenv("CONTEXT_CACHE_SESSIONS", 10000))
+
+# Longest excerpt of a turn kept in the rolling summary
+SUMMARY_EXCERPT_WORDS = 20
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+ROLE_LABELS = {'user': 'User', 'assistant': 'Assistant'}
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (about four characters per token for English)
+    """
+    return len(text) // 4 + 1
+
+def summarize_turn(turn):
+    """
+    Return a one-line extract of a turn for the rolling summary: its first
+    sentence, cut to SUMMARY_EXCERPT_WORDS words
+    """
+    first_sentence = _SENTENCE_END.split(turn.content.strip(), 1)[0]
+    words = first_sentence.split()
+    excerpt = " ".join(words[:SUMMARY_EXCERPT_WORDS])
+    if len(words) > SUMMARY_EXCERPT_WORDS:
+        excerpt += "..."
+    return f"- {ROLE_LABELS.get(turn.role, turn.role)}: {excerpt}"
+
+
+class _SessionContext:
+    __slots__ = ('last_turn', 'window', 'window_tokens', 'summary', 'summary_tokens')
+
+    def __init__(self):
+        # (seq, timestamp) of the newest turn processed
+        self.last_turn = None
+        # (line, tokens, turn) for the turns in the window, oldest first
+        self.window = deque()
+        self.window_tokens = 0
+        self.summary = deque()
+        self.summary_tokens = 0
+
+
+class ContextAssembler:
+    """
+    Keeps per-session context state so each request only processes the
+    turns added since the previous one. Token counts are computed once per
+    turn, and turns leaving the window are folded into the summary.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 max_sessions=CONTEXT_CACHE_SESSIONS):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = _SessionContext()
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def _add_turn(self, state, turn):
+        line = f"{ROLE_LABELS.get(turn.role, turn.role)}: {turn.content}"
+        if estimate_tokens(line) > self.token_budget:
+            line = line[:self.token_budget * 4] + "..."
+        tokens = estimate_tokens(line)
+        state.window.append((line, tokens, turn))
+        state.window_tokens += tokens
+        state.last_turn = (turn.seq, turn.timestamp)
+
+        # Fold the oldest turns into the summary once over budget
+        while state.window_tokens > self.token_budget and len(state.window) > 1:
+            _, old_tokens, old_turn = state.window.popleft()
+            state.window_tokens -= old_tokens
+            summary_line = summarize_turn(old_turn)
+            summary_tokens = estimate_tokens(summary_line)
+            state.summary.append((summary_line, summary_tokens))
+            state.summary_tokens += summary_tokens
+            while state.summary_tokens > self.summary_budget and state.summary:
+                _, dropped = state.summary.popleft()
+                state.summary_tokens -= dropped
+
+    def build(self, session_id, history, end=None):
+        """
+        Return the context text for history[:end] (oldest first), updating
+        the session's state with the turns it has not seen yet.
+        """
+        end = len(history) if end is None else end
+
+        with self._lock:
+            state = self._state(session_id)
+
+            # Walk back only over the turns added since the last request.
+            # Turns are ordered by seq, as timestamps can tie or step back.
+            start = end
+            if state.last_turn is not None:
+                last_seq = state.last_turn[0]
+                while start > 0 and history[start - 1].seq > last_seq:
+                    start -= 1
+                previous = history[start - 1] if start > 0 else None
+                if previous is None or (previous.seq, previous.timestamp) != state.last_turn:
+                    # The last processed turn is gone: the history was reset
+                    # or trimmed elsewhere, so start over from what is stored
+                    state = _SessionContext()
+                    self._sessions[session_id] = state
+                    start = 0
+            else:
+                start = 0
+
+            for index in range(start, end):
+                self._add_turn(state, history[index])
+
+            return self._render(state)
+
+    def _render(self, state):
+        if not state.window:
+            return ""
+        parts = []
+        if state.summary:
+            parts.append("Summary of earlier conversation:\n")
+            parts.append("\n".join(line for line, _ in state.summary))
+            parts.append("\n\n")
+        parts.append("Recent conversation:\n")
+        parts.append("\n".join(line for line, _, _ in state.window))
+        parts.append("\n\n")
+        return "".join(parts)
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
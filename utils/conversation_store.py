@@ -0,0 +1,593 @@
+"""
+Conversation Store - Bounded storage for per-session conversation history
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# Defaults for the in-memory backend, overridable through the environment
+MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", 10000))
+SESSION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", 3600))
+MAX_TURNS_PER_SESSION = int(os.getenv("CONVERSATION_MAX_TURNS", 50))
+
+# Settings for the SQLite backend
+DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+WRITE_BATCH_SIZE = int(os.getenv("CONVERSATION_WRITE_BATCH_SIZE", 64))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", 0.5))
+
+
+class Turn:
+    """
+    A single message in a conversation. Uses __slots__ and a float
+    timestamp to keep the per-turn footprint small. seq numbers the turns
+    of a session in the order they were added; unlike the wall-clock
+    timestamp it never repeats or goes backwards.
+    """
+    __slots__ = ('role', 'content', 'timestamp', 'seq')
+
+    def __init__(self, role, content, timestamp=None, seq=None):
+        self.role = role
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.seq = seq
+
+    def to_dict(self):
+        """
+        Return the turn in the original message dict format
+        """
+        return {
+            'role': self.role,
+            'content': self.content,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+    def __repr__(self):
+        return f"Turn(role={self.role!r}, content={self.content[:30]!r})"
+
+
+class ConversationStore(ABC):
+    """
+    Interface shared by all conversation store backends. A backend missing
+    one of the abstract methods fails when it is created.
+    """
+
+    @abstractmethod
+    def create_session(self, session_id):
+        ...
+
+    @abstractmethod
+    def has_session(self, session_id):
+        ...
+
+    @abstractmethod
+    def get_history(self, session_id):
+        """
+        Return the list of Turn objects for a session (oldest first), each
+        with its seq set
+        """
+
+    @abstractmethod
+    def append(self, session_id, role, content):
+        ...
+
+    @abstractmethod
+    def reset(self, session_id):
+        """
+        Clear the history and state of a session but keep the session itself
+        """
+
+    @abstractmethod
+    def get_state(self, session_id, key):
+        """
+        Return a small JSON-serializable value stored for a session, or None
+        """
+
+    @abstractmethod
+    def set_state(self, session_id, key, value):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id):
+        ...
+
+    def flush(self):
+        """
+        Persist buffered writes. Backends without a write buffer do nothing.
+        """
+
+    @abstractmethod
+    def metrics(self):
+        """
+        Return a dictionary of counters and gauges describing the store
+        """
+
+
+class _Session:
+    __slots__ = ('turns', 'last_access', 'size', 'state', 'next_seq')
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+        self.size = 0
+        self.state = None
+        self.next_seq = 1
+
+
+# Approximate size of a Turn instance plus its float timestamp and deque slot
+_TURN_OVERHEAD = sys.getsizeof(Turn('user', '')) + sys.getsizeof(0.0) + 8
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    In-process store with LRU eviction, an idle TTL per session and a cap
+    on the number of turns kept per session.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS,
+                 max_turns=MAX_TURNS_PER_SESSION):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+
+        # Sessions ordered from least to most recently used
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._evictions = {'lru': 0, 'ttl': 0, 'turns': 0}
+
+    def _expire(self, now):
+        """
+        Drop idle sessions. The least recently used sessions are at the
+        front, so this stops at the first session that is still fresh.
+        """
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry.last_access < self.ttl_seconds:
+                break
+            self._remove(session_id)
+            self._evictions['ttl'] += 1
+
+    def _remove(self, session_id):
+        entry = self._sessions.pop(session_id)
+        self._bytes -= entry.size
+
+    def _touch(self, session_id):
+        """
+        Return a live session entry and mark it as most recently used
+        """
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            entry.last_access = now
+            self._sessions.move_to_end(session_id)
+        return entry
+
+    def _create(self, session_id):
+        """
+        Add an empty session, evicting the least recently used ones if full
+        """
+        while len(self._sessions) >= self.max_sessions:
+            self._remove(next(iter(self._sessions)))
+            self._evictions['lru'] += 1
+        entry = _Session(self.max_turns)
+        self._sessions[session_id] = entry
+        return entry
+
+    def create_session(self, session_id):
+        with self._lock:
+            if self._touch(session_id) is None:
+                self._create(session_id)
+
+    def has_session(self, session_id):
+        with self._lock:
+            return self._touch(session_id) is not None
+
+    def get_history(self, session_id):
+        with self._lock:
+            entry = self._touch(session_id)
+            return list(entry.turns) if entry is not None else []
+
+    def append(self, session_id, role, content):
+        turn = Turn(role, content)
+        turn_size = _TURN_OVERHEAD + sys.getsizeof(content)
+
+        with self._lock:
+            entry = self._touch(session_id) or self._create(session_id)
+
+            # A full deque drops its oldest turn on append
+            if len(entry.turns) == entry.turns.maxlen:
+                oldest = entry.turns[0]
+                removed = _TURN_OVERHEAD + sys.getsizeof(oldest.content)
+                entry.size -= removed
+                self._bytes -= removed
+                self._evictions['turns'] += 1
+
+            turn.seq = entry.next_seq
+            entry.next_seq += 1
+            entry.turns.append(turn)
+            entry.size += turn_size
+            self._bytes += turn_size
+
+    def reset(self, session_id):
+        with self._lock:
+            entry = self._touch(session_id)
+            if entry is not None:
+                entry.turns.clear()
+                entry.state = None
+                self._bytes -= entry.size
+                entry.size = 0
+
+    def get_state(self, session_id, key):
+        with self._lock:
+            entry = self._touch(session_id)
+            if entry is None or entry.state is None:
+                return None
+            return entry.state.get(key)
+
+    def set_state(self, session_id, key, value):
+        with self._lock:
+            entry = self._touch(session_id) or self._create(session_id)
+            if entry.state is None:
+                entry.state = {}
+            entry.state[key] = value
+
+    def delete(self, session_id):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def metrics(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'turns': sum(len(entry.turns) for entry in self._sessions.values()),
+                'memory_bytes': self._bytes,
+                'evictions_lru': self._evictions['lru'],
+                'evictions_ttl': self._evictions['ttl'],
+                'evictions_turns': self._evictions['turns'],
+                'max_sessions': self.max_sessions,
+                'max_turns': self.max_turns,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions (last_access);
+CREATE TABLE IF NOT EXISTS session_state (
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (session_id, key)
+);
+"""
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared statement on every call
+_SQL_TOUCH_SESSION = (
+    "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+    "ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access"
+)
+_SQL_INSERT_TURN = "INSERT INTO turns (session_id, role, content, timestamp, seq) VALUES (?, ?, ?, ?, ?)"
+_SQL_TRIM_TURNS = (
+    "DELETE FROM turns WHERE session_id = ? AND id <= "
+    "(SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)"
+)
+_SQL_HAS_SESSION = "SELECT 1 FROM sessions WHERE session_id = ? AND last_access >= ?"
+_SQL_SELECT_TURNS = (
+    "SELECT role, content, timestamp, seq FROM turns WHERE session_id = ? "
+    "ORDER BY id DESC LIMIT ?"
+)
+_SQL_LAST_SEQ = "SELECT seq FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1"
+_SQL_DELETE_TURNS = "DELETE FROM turns WHERE session_id = ?"
+_SQL_SELECT_STATE = "SELECT value FROM session_state WHERE session_id = ? AND key = ?"
+_SQL_UPSERT_STATE = (
+    "INSERT INTO session_state (session_id, key, value) VALUES (?, ?, ?) "
+    "ON CONFLICT (session_id, key) DO UPDATE SET value = excluded.value"
+)
+_SQL_DELETE_STATE = "DELETE FROM session_state WHERE session_id = ?"
+_SQL_EXPIRED_STATE = (
+    "DELETE FROM session_state WHERE session_id IN "
+    "(SELECT session_id FROM sessions WHERE last_access < ?)"
+)
+_SQL_DELETE_SESSION = "DELETE FROM sessions WHERE session_id = ?"
+_SQL_EXPIRED_TURNS = (
+    "DELETE FROM turns WHERE session_id IN "
+    "(SELECT session_id FROM sessions WHERE last_access < ?)"
+)
+_SQL_EXPIRED_SESSIONS = "DELETE FROM sessions WHERE last_access < ?"
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Conversation store backed by a local SQLite database in WAL mode.
+
+    Several worker processes can share the same database file. Writes are
+    buffered in memory and committed in batches (at the latest when the
+    request finishes and flush() is called), while reads of a session merge
+    in its buffered turns, and those of a batch still being committed, so a
+    request always sees its own writes.
+    """
+
+    def __init__(self, path=DB_PATH, ttl_seconds=SESSION_TTL_SECONDS,
+                 max_turns=MAX_TURNS_PER_SESSION, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending_sessions = {}
+        self._pending_turns = []
+        self._pending_state = {}
+        # The batch being committed, readable until the commit is done
+        self._in_flight_sessions = {}
+        self._in_flight_turns = []
+        self._in_flight_state = {}
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_prune = 0.0
+        self._counters = {'flushes': 0, 'flush_errors': 0, 'rows_written': 0, 'rows_dropped': 0,
+                          'evictions_ttl': 0, 'evictions_turns': 0}
+
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(turns)")}
+            if 'seq' not in columns:
+                # Turns stored before they were numbered; their ids are in order
+                try:
+                    connection.execute("ALTER TABLE turns ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+                    connection.execute("UPDATE turns SET seq = id")
+                except sqlite3.OperationalError as e:
+                    # Another process added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+
+    def _connection(self):
+        """
+        Return the connection for the current thread, reopening it after a
+        fork since SQLite connections must not cross process boundaries.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, cached_statements=64)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def create_session(self, session_id):
+        with self._lock:
+            self._pending_sessions[session_id] = time.time()
+        self._maybe_flush()
+
+    def has_session(self, session_id):
+        with self._lock:
+            if session_id in self._pending_sessions or session_id in self._in_flight_sessions:
+                return True
+        row = self._connection().execute(
+            _SQL_HAS_SESSION, (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return row is not None
+
+    def get_history(self, session_id):
+        # Buffers first: a batch committed while the rows are read then
+        # shows up in both, and its copy in the rows is the one kept
+        with self._lock:
+            in_flight = [turn for pending_id, turn in self._in_flight_turns if pending_id == session_id]
+            pending = [turn for pending_id, turn in self._pending_turns if pending_id == session_id]
+        rows = self._connection().execute(
+            _SQL_SELECT_TURNS, (session_id, self.max_turns)
+        ).fetchall()
+        turns = [Turn(role, content, timestamp, seq) for role, content, timestamp, seq in reversed(rows)]
+
+        if in_flight:
+            committed = {turn.seq for turn in turns}
+            turns.extend(turn for turn in in_flight if turn.seq not in committed)
+        turns.extend(pending)
+        return turns[-self.max_turns:]
+
+    def append(self, session_id, role, content):
+        # Rejected here rather than failing the whole batch on commit
+        if not isinstance(content, str):
+            raise TypeError(f"Turn content must be a string, not {type(content).__name__}")
+        turn = Turn(role, content)
+        with self._lock:
+            buffered = self._last_buffered_seq(session_id)
+        # Only read the stored sequence when nothing newer is buffered
+        committed = 0
+        if buffered is None:
+            row = self._connection().execute(_SQL_LAST_SEQ, (session_id,)).fetchone()
+            committed = row[0] if row is not None else 0
+        with self._lock:
+            turn.seq = max(committed, self._last_buffered_seq(session_id) or 0) + 1
+            self._pending_turns.append((session_id, turn))
+            self._pending_sessions[session_id] = turn.timestamp
+        self._maybe_flush()
+
+    def _last_buffered_seq(self, session_id):
+        for turns in (self._pending_turns, self._in_flight_turns):
+            for pending_id, turn in reversed(turns):
+                if pending_id == session_id:
+                    return turn.seq
+        return None
+
+    def reset(self, session_id):
+        self.flush()
+        with self._connection() as connection:
+            connection.execute(_SQL_DELETE_TURNS, (session_id,))
+            connection.execute(_SQL_DELETE_STATE, (session_id,))
+
+    def delete(self, session_id):
+        self.flush()
+        with self._connection() as connection:
+            connection.execute(_SQL_DELETE_TURNS, (session_id,))
+            connection.execute(_SQL_DELETE_STATE, (session_id,))
+            connection.execute(_SQL_DELETE_SESSION, (session_id,))
+
+    def get_state(self, session_id, key):
+        with self._lock:
+            for state in (self._pending_state, self._in_flight_state):
+                if (session_id, key) in state:
+                    return state[(session_id, key)]
+        row = self._connection().execute(_SQL_SELECT_STATE, (session_id, key)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set_state(self, session_id, key, value):
+        json.dumps(value)  # raises now if the value can't be stored
+        with self._lock:
+            self._pending_state[(session_id, key)] = value
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if (len(self._pending_turns) >= self.batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        # One batch in flight at a time, so readers only have one to merge in
+        with self._flush_lock:
+            with self._lock:
+                sessions = self._in_flight_sessions = self._pending_sessions
+                turns = self._in_flight_turns = self._pending_turns
+                state = self._in_flight_state = self._pending_state
+                self._pending_sessions, self._pending_turns, self._pending_state = {}, [], {}
+                self._last_flush = time.monotonic()
+            if not sessions and not turns and not state:
+                return
+
+            touched = {session_id for session_id, _ in turns}
+            rows = len(sessions) + len(turns) + len(state)
+            try:
+                with self._connection() as connection:
+                    connection.executemany(_SQL_TOUCH_SESSION, sessions.items())
+                    connection.executemany(_SQL_INSERT_TURN, [
+                        (session_id, turn.role, turn.content, turn.timestamp, turn.seq)
+                        for session_id, turn in turns
+                    ])
+                    connection.executemany(_SQL_UPSERT_STATE, [
+                        (session_id, key, json.dumps(value))
+                        for (session_id, key), value in state.items()
+                    ])
+                    trimmed = 0
+                    for session_id in touched:
+                        trimmed += connection.execute(
+                            _SQL_TRIM_TURNS, (session_id, session_id, self.max_turns)
+                        ).rowcount
+            except sqlite3.OperationalError:
+                # Locked or busy database: the transaction was rolled back, so
+                # put the writes back in front of anything buffered since and
+                # let the next flush retry them
+                with self._lock:
+                    self._pending_sessions = {**sessions, **self._pending_sessions}
+                    self._pending_turns = turns + self._pending_turns
+                    self._pending_state = {**state, **self._pending_state}
+                    self._clear_in_flight()
+                    self._counters['flush_errors'] += 1
+                raise
+            except Exception as e:
+                # The batch itself was rejected (a failed constraint, say), so a
+                # retry would fail again and hold up every later write
+                print(f"Error writing conversations, dropping {rows} rows: {e}")
+                with self._lock:
+                    self._clear_in_flight()
+                    self._counters['flush_errors'] += 1
+                    self._counters['rows_dropped'] += rows
+                return
+            with self._lock:
+                self._clear_in_flight()
+                self._counters['evictions_turns'] += trimmed
+                self._counters['flushes'] += 1
+                self._counters['rows_written'] += rows
+
+        # Expiring idle sessions is a full index range scan, so do it rarely
+        now = time.monotonic()
+        if now - self._last_prune >= min(self.ttl_seconds, 60):
+            self._last_prune = now
+            self.prune()
+
+    def _clear_in_flight(self):
+        self._in_flight_sessions, self._in_flight_turns, self._in_flight_state = {}, [], {}
+
+    def prune(self):
+        """
+        Delete sessions that have been idle for longer than the TTL
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self._connection() as connection:
+            connection.execute(_SQL_EXPIRED_TURNS, (cutoff,))
+            connection.execute(_SQL_EXPIRED_STATE, (cutoff,))
+            expired = connection.execute(_SQL_EXPIRED_SESSIONS, (cutoff,)).rowcount
+        with self._lock:
+            self._counters['evictions_ttl'] += expired
+
+    def metrics(self):
+        connection = self._connection()
+        sessions = connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        turns = connection.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'sessions': sessions,
+            'turns': turns,
+            'pending_writes': len(self._pending_turns),
+            'disk_bytes': page_count * page_size,
+            'flushes': self._counters['flushes'],
+            'flush_errors': self._counters['flush_errors'],
+            'rows_written': self._counters['rows_written'],
+            'rows_dropped': self._counters['rows_dropped'],
+            'evictions_ttl': self._counters['evictions_ttl'],
+            'evictions_turns': self._counters['evictions_turns'],
+            'max_turns': self.max_turns,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+# Registered backends, selected with the CONVERSATION_STORE environment variable
+STORE_BACKENDS = {
+    'memory': InMemoryConversationStore,
+    'sqlite': SQLiteConversationStore
+}
+
+def register_store_backend(name, factory):
+    """
+    Register a conversation store backend under a name
+    """
+    STORE_BACKENDS[name] = factory
+
+def create_conversation_store(backend=None, **options):
+    """
+    Create the conversation store configured for this process
+    """
+    backend = backend or os.getenv("CONVERSATION_STORE", "memory")
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"Unknown conversation store backend: {backend}")
+    return STORE_BACKENDS[backend](**options)
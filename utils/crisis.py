@@ -0,0 +1,35 @@
+"""
+Crisis - Immediate reply for messages that need urgent help. It is sent
+before, and independently of, any model call.
+"""
+
+# Reviewed wording sent as-is; it is never generated or cached
+CRISIS_RESPONSE = (
+    "I'm really glad you told me, and I'm concerned about your safety. **You don't have to go through this alone**.\n\n"
+    "Please reach out for support right now:\n\n"
+    "- **Call or text 988** (Suicide & Crisis Lifeline, 24/7)\n"
+    "- **Text HOME to 741741** (Crisis Text Line)\n"
+    "- **Call 911** or go to the nearest emergency room if you are in immediate danger\n\n"
+    "If you're outside the US, your local emergency number or crisis line can help. I'm still here with you."
+)
+
+def is_crisis(mental_health_data):
+    return bool(mental_health_data['immediate_help'])
+
+def crisis_reply(catalog, trend, follow_up=False):
+    """
+    Response fields for the fast path: the vetted message and the
+    critical resources, with no exercise. follow_up tells the client a
+    model-written reply will follow on the stream.
+    """
+    return {
+        'status': 'success',
+        'message': CRISIS_RESPONSE,
+        'exercise': None,
+        'resources': catalog.resources('critical'),
+        'concern_level': 'critical',
+        'trend_concern_level': trend.concern_level(),
+        'trend_escalating': trend.escalating,
+        'crisis': True,
+        'follow_up': follow_up
+    }
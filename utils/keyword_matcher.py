@@ -0,0 +1,115 @@
+"""
+Keyword Matcher - Token-level Aho-Corasick automaton used to score messages
+against the mental health lexicons in a single pass
+"""
+
+import re
+from collections import deque
+
+# Words are runs of letters/digits, optionally joined by apostrophes (can't, i'm)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# Typographic apostrophes are common on mobile keyboards
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+
+
+def normalize_text(text):
+    """
+    Lowercase text and normalize apostrophes so lexicon terms and user
+    messages tokenize the same way.
+    """
+    return text.lower().translate(_APOSTROPHES)
+
+
+def tokenize(text):
+    """
+    Split text into normalized word tokens.
+    """
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+
+class KeywordMatcher:
+    """
+    Matches every term of several category lexicons in one linear pass.
+
+    Terms may span several words ("too much", "can't cope"). The automaton
+    is built over tokens rather than characters, so a term only matches on
+    whole-word boundaries.
+    """
+
+    def __init__(self, lexicons):
+        self.categories = tuple(lexicons)
+        self.terms = []
+
+        # Collect the categories for each distinct term
+        term_categories = {}
+        for category, words in lexicons.items():
+            for word in words:
+                tokens = tuple(tokenize(word))
+                if tokens:
+                    term_categories.setdefault(tokens, set()).add(category)
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for tokens, categories in term_categories.items():
+            node = 0
+            for token in tokens:
+                next_node = self._goto[node].get(token)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][token] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                node = next_node
+            self._output[node] = tuple(sorted(categories))
+            self.terms.append((tokens, frozenset(categories)))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        """
+        Breadth-first pass computing failure links and merging the outputs
+        of each node with the outputs of its failure target.
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                inherited = self._output[self._fail[child]]
+                if inherited:
+                    self._output[child] = self._output[child] + inherited
+
+    def scan_tokens(self, tokens):
+        """
+        Count term matches per category in an already tokenized message.
+        """
+        counts = dict.fromkeys(self.categories, 0)
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        node = 0
+        for token in tokens:
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for category in output[node]:
+                counts[category] += 1
+
+        return counts
+
+    def scan(self, text):
+        """
+        Tokenize text and count term matches per category.
+        Returns a (counts, token_count) tuple.
+        """
+        tokens = tokenize(text)
+        return self.scan_tokens(tokens), len(tokens)
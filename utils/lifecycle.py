@@ -0,0 +1,67 @@
+"""
+Lifecycle - Preload hooks for pre-fork servers such as gunicorn
+
+The app is imported once in the master process, which builds the
+read-only data (keyword tables, prompt templates, fallback replies, the
+pre-encoded catalog, fingerprinted assets and the semantic index). Forked
+workers share those pages copy-on-write instead of each building its own
+copy, and a respawned worker only needs post_fork(). See gunicorn.conf.py.
+"""
+
+import gc
+import os
+import time
+
+from utils.catalog import get_catalog
+from utils.compression import get_brotli
+from utils.mental_health_utils import get_classifier_mode
+from utils.response_generator import llm_router, warm_up
+
+
+def preload():
+    """
+    Run in the master once the app is imported, right before the first
+    fork. Builds what is otherwise done lazily, then freezes the heap.
+    Returns the seconds taken.
+    """
+    started = time.perf_counter()
+    try:
+        get_catalog()
+        get_brotli()
+        if get_classifier_mode() != "keyword":
+            # The exemplar index is memory-mapped, so workers share its pages too
+            from utils.semantic_classifier import get_semantic_classifier
+            get_semantic_classifier()
+        # Client libraries take most of a second to import; clients themselves
+        # hold sockets and are only created in the workers
+        for provider in llm_router.providers.values():
+            try:
+                provider.preload()
+            except Exception as e:
+                print(f"Error preloading the {provider.name} provider: {e}")
+
+        # Everything allocated so far lives as long as the process. Moving it
+        # out of the collector's generations means a collection in a worker
+        # never writes to those objects, which would copy their pages.
+        gc.collect()
+        gc.freeze()
+    finally:
+        # gunicorn.conf.py turns the collector off while the app is imported;
+        # the master keeps running (and respawning workers), so it needs it back
+        gc.enable()
+    elapsed = time.perf_counter() - started
+    print(f"Preloaded shared data in {elapsed * 1000:.0f} ms ({gc.get_freeze_count()} objects frozen)")
+    return elapsed
+
+def post_fork():
+    """
+    Run in each worker right after it is forked. Model clients are made
+    again so no connection is shared with the master. Thread pools,
+    SQLite connections and the transcript writer thread check the pid and
+    rebuild themselves on first use.
+    """
+    gc.enable()
+    for provider in llm_router.providers.values():
+        provider.reset()
+    if os.getenv("LAZY_INIT", "True") != 'True':
+        warm_up(connect=os.getenv("WARM_UP_CONNECT") == 'True')
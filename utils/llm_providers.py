@@ -0,0 +1,360 @@
+"""
+LLM Providers - Interchangeable model backends (Gemini, OpenAI-compatible
+endpoints including local servers, and an offline template backend) and
+routing between them by concern level
+"""
+
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from utils.resilience import CircuitBreaker
+
+
+class ProviderNotConfigured(Exception):
+    """Raised when a provider is routed to but has no credentials or endpoint"""
+
+
+class EmptyResponse(Exception):
+    """Raised when the model returns no text, e.g. a refusal or a tool call"""
+
+
+@lru_cache(maxsize=None)
+def get_genai():
+    """
+    Import and configure the Google Generative AI client on first use.
+    The import alone takes most of a second, so it is kept off the
+    module import path.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai
+
+
+class LLMProvider(ABC):
+    """
+    Interface shared by all providers. generate returns the reply text,
+    stream yields it in chunks and generate_async is the asyncio version
+    of generate. timeout is the client-side request timeout in seconds.
+    A provider must implement generate and generate_async; the other
+    methods have defaults.
+    """
+    name = None
+
+    def __init__(self):
+        # Each provider fails independently, so each gets its own breaker
+        self.breaker = CircuitBreaker()
+
+    def is_configured(self):
+        return True
+
+    @abstractmethod
+    def generate(self, prompt, concern_level, mental_health_data, timeout=None):
+        ...
+
+    def stream(self, prompt, concern_level, mental_health_data, timeout=None):
+        yield self.generate(prompt, concern_level, mental_health_data, timeout)
+
+    @abstractmethod
+    async def generate_async(self, prompt, concern_level, mental_health_data, timeout=None):
+        ...
+
+    def warm_up(self, connect=False):
+        pass
+
+    def preload(self):
+        """
+        Import the client library without creating clients or connecting,
+        so a pre-fork server imports it once for all its workers
+        """
+
+    def reset(self):
+        """
+        Drop clients and connections, e.g. in a freshly forked worker
+        """
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini through google-generativeai. One GenerativeModel per
+    concern level is created on first use and shared by all requests.
+    """
+    name = "gemini"
+
+    def __init__(self, model_name, generation_configs, client=None):
+        super().__init__()
+        self.model_name = model_name
+        self.generation_configs = generation_configs
+        self.client = client
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        return self.client is not None or bool(os.getenv("GOOGLE_API_KEY"))
+
+    def get_model(self, concern_level="low"):
+        model = self._models.get(concern_level)
+        if model is None:
+            with self._lock:
+                model = self._models.get(concern_level)
+                if model is None:
+                    client = self.client if self.client is not None else get_genai()
+                    model = client.GenerativeModel(
+                        model_name=self.model_name,
+                        generation_config=self.generation_configs.get(concern_level, self.generation_configs["low"])
+                    )
+                    self._models[concern_level] = model
+        return model
+
+    def generate(self, prompt, concern_level, mental_health_data, timeout=None):
+        response = self.get_model(concern_level).generate_content(prompt, request_options={"timeout": timeout})
+        return response.text
+
+    def stream(self, prompt, concern_level, mental_health_data, timeout=None):
+        response = self.get_model(concern_level).generate_content(
+            prompt, stream=True, request_options={"timeout": timeout}
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def generate_async(self, prompt, concern_level, mental_health_data, timeout=None):
+        response = await self.get_model(concern_level).generate_content_async(
+            prompt, request_options={"timeout": timeout}
+        )
+        return response.text
+
+    def warm_up(self, connect=False):
+        for concern_level in self.generation_configs:
+            self.get_model(concern_level)
+        if connect:
+            self.get_model("low").count_tokens("warm up")
+
+    def preload(self):
+        if self.client is None and self.is_configured():
+            get_genai()
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+            # google-generativeai keeps its own clients; configuring it again drops them
+            if self.client is None and get_genai.cache_info().currsize:
+                get_genai().configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_openai():
+    """
+    Import the OpenAI client on first use
+    """
+    import openai
+    return openai
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any server implementing the OpenAI chat completions API: OpenAI itself
+    or a locally hosted model (Ollama, vLLM, llama.cpp server, ...)
+    """
+
+    def __init__(self, name, model, generation_configs, base_url=None, api_key=None):
+        super().__init__()
+        self.name = name
+        self.model = model
+        self.generation_configs = generation_configs
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def is_configured(self):
+        return bool(self.api_key or self.base_url)
+
+    def _client_args(self):
+        # Local servers usually ignore the key, but the client requires one
+        return {'base_url': self.base_url, 'api_key': self.api_key or "not-needed", 'max_retries': 0}
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = get_openai().OpenAI(**self._client_args())
+        return self._client
+
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = get_openai().AsyncOpenAI(**self._client_args())
+        return self._async_client
+
+    def _request(self, prompt, concern_level, timeout):
+        config = self.generation_configs.get(concern_level, self.generation_configs["low"])
+        return {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': config["temperature"],
+            'max_tokens': config["max_output_tokens"],
+            'timeout': timeout
+        }
+
+    def _reply_text(self, completion):
+        # content is None for refusals and tool calls
+        content = completion.choices[0].message.content if completion.choices else None
+        if not content:
+            raise EmptyResponse(f"The {self.name} provider returned no text")
+        return content
+
+    def generate(self, prompt, concern_level, mental_health_data, timeout=None):
+        completion = self.client().chat.completions.create(**self._request(prompt, concern_level, timeout))
+        return self._reply_text(completion)
+
+    def stream(self, prompt, concern_level, mental_health_data, timeout=None):
+        events = self.client().chat.completions.create(
+            stream=True, **self._request(prompt, concern_level, timeout)
+        )
+        for event in events:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+    async def generate_async(self, prompt, concern_level, mental_health_data, timeout=None):
+        completion = await self.async_client().chat.completions.create(
+            **self._request(prompt, concern_level, timeout)
+        )
+        return self._reply_text(completion)
+
+    def warm_up(self, connect=False):
+        self.client()
+        if connect:
+            self.client().models.list()
+
+    def preload(self):
+        if self.is_configured():
+            get_openai()
+
+    def reset(self):
+        with self._lock:
+            self._client = None
+            self._async_client = None
+
+
+class TemplateProvider(LLMProvider):
+    """
+    Offline backend that answers from canned replies. The reply is chosen
+    by hashing the prompt, so the same request always gets the same answer.
+    """
+    name = "template"
+
+    def __init__(self, responses, select_category, words_per_chunk=8):
+        super().__init__()
+        self.responses = responses
+        self.select_category = select_category
+        self.words_per_chunk = words_per_chunk
+
+    def generate(self, prompt, concern_level, mental_health_data, timeout=None):
+        replies = self.responses[self.select_category(mental_health_data)]
+        return replies[zlib.crc32(prompt.encode("utf-8")) % len(replies)]
+
+    def stream(self, prompt, concern_level, mental_health_data, timeout=None):
+        words = self.generate(prompt, concern_level, mental_health_data).split(" ")
+        for start in range(0, len(words), self.words_per_chunk):
+            text = " ".join(words[start:start + self.words_per_chunk])
+            yield text if start == 0 else " " + text
+
+    async def generate_async(self, prompt, concern_level, mental_health_data, timeout=None):
+        return self.generate(prompt, concern_level, mental_health_data)
+
+
+def parse_routes(spec):
+    """
+    Parse "low=local,critical=gemini" into {'low': 'local', 'critical': 'gemini'}
+    """
+    routes = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        concern_level, _, provider = part.partition("=")
+        routes[concern_level.strip()] = provider.strip()
+    return routes
+
+
+# Provider used when LLM_PROVIDER is unset or names no known provider
+DEFAULT_PROVIDER = "gemini"
+
+
+class ProviderRouter:
+    """
+    Maps each concern level to a provider. Levels without a route use the
+    default provider. Unknown provider names are logged and replaced by
+    the default, so a typo in the settings doesn't stop the app.
+    """
+
+    def __init__(self, providers, default=DEFAULT_PROVIDER, routes=None):
+        self.providers = {provider.name: provider for provider in providers}
+        if default not in self.providers:
+            print(f"Unknown LLM provider {default!r} in LLM_PROVIDER - using {DEFAULT_PROVIDER}")
+            default = DEFAULT_PROVIDER
+        self.default = default
+        self.routes = {}
+        for concern_level, name in (routes or {}).items():
+            if name not in self.providers:
+                print(f"Unknown LLM provider {name!r} in LLM_ROUTES for {concern_level} - using {default}")
+                continue
+            self.routes[concern_level] = name
+
+    def register(self, provider):
+        """
+        Add a provider, replacing any existing one with the same name
+        """
+        self.providers[provider.name] = provider
+
+    def for_level(self, concern_level):
+        return self.providers[self.routes.get(concern_level, self.default)]
+
+    def active_providers(self):
+        names = {self.default, *self.routes.values()}
+        return [self.providers[name] for name in sorted(names)]
+
+    def metrics(self):
+        values = {}
+        for provider in self.active_providers():
+            for key, value in provider.breaker.metrics().items():
+                values[f"{provider.name}_circuit_{key}"] = value
+        return values
+
+
+def create_router(model_name, generation_configs, offline_provider):
+    """
+    Build the router from the environment. Available providers are
+    gemini, openai (OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL), local
+    (LOCAL_LLM_BASE_URL, LOCAL_LLM_MODEL) and template (offline).
+
+    LLM_PROVIDER picks the default provider and LLM_ROUTES overrides it per
+    concern level, e.g. "low=local,moderate=local,critical=gemini".
+    """
+    providers = [
+        GeminiProvider(os.getenv("GEMINI_MODEL", model_name), generation_configs),
+        OpenAICompatibleProvider(
+            "openai",
+            os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            generation_configs,
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            api_key=os.getenv("OPENAI_API_KEY")
+        ),
+        OpenAICompatibleProvider(
+            "local",
+            os.getenv("LOCAL_LLM_MODEL", "llama3.1"),
+            generation_configs,
+            base_url=os.getenv("LOCAL_LLM_BASE_URL"),
+            api_key=os.getenv("LOCAL_LLM_API_KEY")
+        ),
+        offline_provider
+    ]
+    return ProviderRouter(
+        providers,
+        os.getenv("LLM_PROVIDER", DEFAULT_PROVIDER),
+        parse_routes(os.getenv("LLM_ROUTES", ""))
+    )
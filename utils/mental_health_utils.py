@@ -2,14 +2,12 @@
 Mental Health Utils - Contains functions to identify potential signs of 
 mental health issues from user input.
 """
-import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+import os
 
-# Ensure NLTK data is downloaded
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
+from utils.keyword_matcher import KeywordMatcher
+
+# Scored categories, in the order they are reported
+CATEGORIES = ('anxiety', 'depression', 'burnout', 'suicidal')
 
 # Keywords related to different mental health states
 ANXIETY_KEYWORDS = [
@@ -41,25 +39,64 @@ IMMEDIATE_HELP_NEEDED_PHRASES = [
     'can\'t go on anymore', 'want to end it all', 'ready to die'
 ]
 
+# Compiled once at import time so every message is scored in a single pass
+KEYWORD_MATCHER = KeywordMatcher({
+    'anxiety': ANXIETY_KEYWORDS,
+    'depression': DEPRESSION_KEYWORDS,
+    'burnout': BURNOUT_KEYWORDS,
+    'suicidal': SUICIDAL_KEYWORDS,
+    'immediate_help': IMMEDIATE_HELP_NEEDED_PHRASES
+})
+
+def get_classifier_mode():
+    """
+    CLASSIFIER_MODE is keyword (default), semantic or hybrid. Read on each
+    call since this module is imported before the .env file is loaded.
+    """
+    return os.getenv("CLASSIFIER_MODE", "keyword").lower()
+
 def detect_mental_health_issues(message):
     """
     Detect potential mental health issues from user input.
     Returns a dictionary with detected issues and confidence scores.
     """
+    mode = get_classifier_mode()
+    if mode == "keyword":
+        return detect_by_keywords(message)
+
+    result = detect_by_keywords(message)
     if not message:
-        return {
-            'anxiety': 0,
-            'depression': 0,
-            'burnout': 0,
-            'suicidal': 0,
-            'immediate_help': False
-        }
-        
-    message = message.lower()
-    
-    # Use a simple word split instead of NLTK tokenization to avoid errors
-    words = message.split()
-    
+        return result
+    try:
+        from utils.semantic_classifier import get_semantic_classifier
+        scores, crisis = get_semantic_classifier().scores(message)
+    except Exception as e:
+        print(f"Error in semantic classifier: {e} - using keyword scores")
+        return result
+
+    return combine_scores(result, scores, crisis, mode)
+
+def combine_scores(result, scores, crisis, mode="hybrid"):
+    """
+    Merge semantic scores and crisis flag into keyword scores (result,
+    updated in place). Hybrid takes the higher score per category;
+    semantic uses the similarity scores only.
+    """
+    # Keyword crisis phrases always count, whatever the mode
+    for key in CATEGORIES:
+        if mode == "semantic" and not (key == 'suicidal' and result['immediate_help']):
+            result[key] = scores[key]
+        else:
+            result[key] = max(result[key], scores[key])
+    if crisis:
+        result['immediate_help'] = True
+        result['suicidal'] = 1.0
+    return result
+
+def detect_by_keywords(message):
+    """
+    Keyword-based scores: matched keywords per word of the message
+    """
     result = {
         'anxiety': 0,
         'depression': 0,
@@ -68,30 +105,25 @@ def detect_mental_health_issues(message):
         'immediate_help': False
     }
     
+    if not message:
+        return result
+        
+    counts, word_count = KEYWORD_MATCHER.scan(message)
+    
     # Check for immediate help needed phrases first
-    for phrase in IMMEDIATE_HELP_NEEDED_PHRASES:
-        if phrase in message:
-            result['immediate_help'] = True
-            result['suicidal'] = 1.0
-            break
+    if counts['immediate_help']:
+        result['immediate_help'] = True
+        result['suicidal'] = 1.0
             
     # Calculate confidence scores
-    word_count = len(words)
     if word_count == 0:
         return result
         
-    for word in words:
-        if word in ANXIETY_KEYWORDS:
-            result['anxiety'] += 1/word_count
-        if word in DEPRESSION_KEYWORDS:
-            result['depression'] += 1/word_count
-        if word in BURNOUT_KEYWORDS:
-            result['burnout'] += 1/word_count
-        if word in SUICIDAL_KEYWORDS:
-            result['suicidal'] += 1/word_count
+    for key in CATEGORIES:
+        result[key] += counts[key] / word_count
     
     # Normalize scores between 0 and 1
-    for key in ['anxiety', 'depression', 'burnout', 'suicidal']:
+    for key in CATEGORIES:
         result[key] = min(result[key], 1.0)
         
     return result
@@ -0,0 +1,226 @@
+"""
+Metrics - Low-overhead latency histograms, counters and a sampling
+profiler, exposed in the Prometheus text format
+"""
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, one series per combination of label values
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[labelvalues] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count)
+                        for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', le))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter, one series per combination of label values
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+# Metrics recorded on the chat hot path
+STAGE_LATENCY = Histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a chat request",
+    labelnames=("stage",)
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling each HTTP request",
+    labelnames=("endpoint", "status")
+)
+FALLBACK_RESPONSES = Counter(
+    "chat_fallback_responses_total",
+    "Fallback replies served instead of a fresh model reply",
+    labelnames=("reason",)
+)
+ERRORS = Counter(
+    "chat_errors_total",
+    "Errors caught while handling requests",
+    labelnames=("location",)
+)
+
+CRISIS_RESPONSES = Counter(
+    "chat_crisis_fast_path_total",
+    "Crisis messages answered on the fast path without waiting for the model",
+    labelnames=("endpoint",)
+)
+
+_METRICS = [STAGE_LATENCY, REQUEST_LATENCY, FALLBACK_RESPONSES, ERRORS, CRISIS_RESPONSES]
+_gauge_sources = {}
+
+
+@contextmanager
+def timed(stage):
+    """
+    Record the duration of a block in the stage latency histogram
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage)
+
+def register_gauge_source(prefix, source):
+    """
+    Register a callable returning a dict of numeric values (for example a
+    store's or cache's metrics()). Each numeric value is exported as a
+    gauge named <prefix>_<key>.
+    """
+    _gauge_sources[prefix] = source
+
+def render_prometheus():
+    """
+    Return all metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+
+    for prefix, source in _gauge_sources.items():
+        try:
+            values = source()
+        except Exception as e:
+            print(f"Error collecting metrics from {prefix}: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread at a fixed interval from a background
+    thread. Cheap enough to switch on for a single request.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005, max_depth=30):
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def top(self, limit=10):
+        """
+        Return the most frequently sampled leaf frames as (frame, samples)
+        """
+        leaves = _Tally()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def report(self, limit=10):
+        total = sum(self.samples.values())
+        lines = [f"Sampling profile: {total} samples every {self.interval * 1000:.1f} ms"]
+        for frame, count in self.top(limit):
+            lines.append(f"  {count:5d}  {frame}")
+        return "\n".join(lines)
@@ -0,0 +1,125 @@
+"""
+Prompt Templates - Registry of system prompts, built once at import time
+"""
+
+import json
+import os
+
+# Shared guidelines that start every system prompt. Keeping them as one
+# stable prefix makes the prompt friendly to provider-side prompt caching.
+SYSTEM_GUIDELINES = (
+    "You are an empathetic mental health support chatbot with expertise in emotional support. "
+    "Follow these guidelines:\n\n"
+    "1. TONE & STYLE:\n"
+    "- Use a warm, compassionate, and understanding tone\n"
+    "- Validate emotions and experiences\n"
+    "- Write responses in 3-4 sentence and exceed if there is a need \n"
+    "- Use phrases like 'I understand', 'It's completely normal to feel', 'You're not alone'\n\n"
+    "2. RESPONSE STRUCTURE:\n"
+    "- If user is facing a problem, first notify him the issue he is facing"
+    "- Start with emotional acknowledgment\n"
+    "- Provide gentle guidance and support\n"
+    "- Include one practical suggestion or coping strategy\n"
+    "- End with a supportive statement\n\n"
+    "3. RESOURCES:\n"
+    "-Provide resources only if the user asks for resources"
+    "- Include 1-2 relevant online resources or websites\n"
+    "- Suggest appropriate self-help tools or apps\n"
+    "- Mention credible mental health organizations\n\n"
+    "4. FORMATTING & READABILITY:\n"
+    "- Use proper Markdown formatting in your responses\n"
+    "- Split text into paragraphs (2-3 sentences per paragraph)\n"
+    "- Use **bold** for emphasis on important words or phrases\n"
+    "- Use bullet points for lists when appropriate\n"
+    "- Include a clear visual structure with spaces between paragraphs\n\n"
+    "5. IMPORTANT RULES:\n"
+    "- NEVER diagnose or provide medical advice\n"
+    "- Keep responses conversational yet professional\n"
+    "- Always prioritize user safety\n"
+    "- Encourage professional help when appropriate\n\n"
+)
+
+# Guidance appended for each prompt variant
+ISSUE_GUIDANCE = {
+    "general": "",
+    "anxiety": (
+        "The user may be experiencing anxiety. "
+        "Focus on grounding techniques and present moment awareness."
+    ),
+    "depression": (
+        "The user may be experiencing depression. "
+        "Offer gentle encouragement and validate their feelings."
+    ),
+    "burnout": (
+        "The user may be experiencing burnout. "
+        "Emphasize the importance of rest and boundaries."
+    ),
+    "crisis": (
+        "The user may be in crisis and need immediate help. "
+        "Express concern, validate their feelings, and strongly encourage "
+        "them to contact a crisis service immediately. Be direct but compassionate."
+    ),
+}
+
+DEFAULT_TEMPLATE_VERSION = "builtin-1"
+
+
+class PromptTemplates:
+    """
+    Prebuilt system prompts, one per variant, for one template version
+    """
+
+    def __init__(self, version=DEFAULT_TEMPLATE_VERSION, guidelines=SYSTEM_GUIDELINES,
+                 issue_guidance=None):
+        self.version = version
+        issue_guidance = ISSUE_GUIDANCE if issue_guidance is None else issue_guidance
+        missing = set(ISSUE_GUIDANCE) - set(issue_guidance)
+        if missing:
+            raise ValueError(f"Prompt templates are missing variants: {sorted(missing)}")
+        self.prompts = {
+            variant: guidelines + guidance
+            for variant, guidance in issue_guidance.items()
+        }
+
+    def get(self, variant):
+        return self.prompts[variant]
+
+
+def get_prompt_variant(mental_health_data):
+    """
+    Return the prompt variant for the detected mental health state:
+    crisis, anxiety, depression, burnout or general
+    """
+    if mental_health_data['immediate_help']:
+        return "crisis"
+    
+    # Determine the most prominent issue (ties go to the earlier issue)
+    anxiety = mental_health_data['anxiety']
+    depression = mental_health_data['depression']
+    burnout = mental_health_data['burnout']
+    top_score = max(anxiety, depression, burnout)
+    if top_score <= 0.3:
+        return "general"
+    if anxiety == top_score:
+        return "anxiety"
+    if depression == top_score:
+        return "depression"
+    return "burnout"
+
+def load_templates(path):
+    """
+    Load a versioned template set from a JSON file of the form
+    {"version": "...", "guidelines": "...", "issues": {"general": "...", ...}}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return PromptTemplates(
+        version=data["version"],
+        guidelines=data.get("guidelines", SYSTEM_GUIDELINES),
+        issue_guidance={**ISSUE_GUIDANCE, **data.get("issues", {})}
+    )
+
+
+# Built once at import time; PROMPT_TEMPLATES_FILE selects a versioned file
+_templates_file = os.getenv("PROMPT_TEMPLATES_FILE")
+PROMPT_TEMPLATES = load_templates(_templates_file) if _templates_file else PromptTemplates()
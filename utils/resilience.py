@@ -0,0 +1,283 @@
+"""
+Resilience - Deadlines, hedged retries and a circuit breaker for upstream
+model calls
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Latency budget for one model call, in seconds
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", 8))
+# Start a second, hedged attempt if the first has not answered by then
+# (0 disables hedging)
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", 0))
+# Extra time given to the client's own request timeout, so the deadline
+# here always fires first and abandoned calls still end soon after
+CLIENT_TIMEOUT_GRACE_SECONDS = 1.0
+# Threads available for deadline-bound model calls in each process
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", 64))
+# Separate threads for crisis calls, so they never queue behind normal traffic
+LLM_PRIORITY_WORKERS = int(os.getenv("LLM_PRIORITY_WORKERS", 4))
+# Consecutive failures that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call does not finish within its latency budget"""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream that is failing repeatedly"""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures
+    the circuit opens and calls are refused for reset_seconds. Then one
+    probe call is let through (half open); its outcome closes or reopens
+    the circuit. A probe that never reports back is replaced after another
+    reset_seconds.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self):
+        """
+        Return True if a call may be made now
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_seconds:
+                # Let a single probe through
+                self.state = 'half_open'
+                self._opened_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'open': int(self.state == 'open'),
+                'half_open': int(self.state == 'half_open'),
+                'consecutive_failures': self._failures,
+                'rejected': self.rejected,
+                'opened': self.opened
+            }
+
+
+_executors = {}
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_executor(priority=False):
+    """
+    Shared thread pool for deadline-bound calls, recreated after a fork.
+    priority=True returns the smaller pool reserved for crisis calls.
+    """
+    global _executor_pid
+    pid = os.getpid()
+    executor = _executors.get(priority)
+    if executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor_pid != pid:
+                _executors.clear()
+                _executor_pid = pid
+            executor = _executors.get(priority)
+            if executor is None:
+                if priority:
+                    executor = ThreadPoolExecutor(max_workers=LLM_PRIORITY_WORKERS, thread_name_prefix="llm-priority")
+                else:
+                    executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="llm-call")
+                _executors[priority] = executor
+    return executor
+
+
+def _attempt_plan(deadline, hedge_after):
+    hedging = bool(hedge_after) and hedge_after < deadline
+    return (2 if hedging else 1), (hedge_after if hedging else None)
+
+def _submit_holding(executor, slots, function, *args):
+    """
+    Submit function(*args), releasing one of slots when it really finishes
+    (or is cancelled before starting), not when the caller stops waiting
+    """
+    try:
+        future = executor.submit(function, *args)
+    except Exception:
+        if slots is not None:
+            slots.release()
+        raise
+    if slots is not None:
+        future.add_done_callback(lambda _: slots.release())
+    return future
+
+def call_with_deadline(function, deadline=LLM_DEADLINE_SECONDS, hedge_after=LLM_HEDGE_AFTER_SECONDS,
+                       priority=False, slots=None):
+    """
+    Run function(timeout) on the shared pool and return its result, or
+    raise DeadlineExceeded once deadline seconds have passed. timeout is
+    the time left in the budget plus CLIENT_TIMEOUT_GRACE_SECONDS, for
+    the client's own request timeout.
+
+    With hedging, a second attempt starts if the first has not finished
+    after hedge_after seconds, or straight away if the first fails; the
+    first successful result wins. The calling thread is released at the
+    deadline even if an attempt is still running.
+
+    slots (see utils/admission.ModelCallLimiter) caps upstream calls: the
+    caller has taken one slot for the first attempt, a hedge only starts
+    if it can take another, and each is held until its attempt finishes.
+    """
+    max_attempts, hedge_at = _attempt_plan(deadline, hedge_after)
+    executor = get_executor(priority)
+    started = time.monotonic()
+
+    pending = {_submit_holding(executor, slots, function, deadline + CLIENT_TIMEOUT_GRACE_SECONDS)}
+    attempts = 1
+    last_error = None
+
+    while pending:
+        elapsed = time.monotonic() - started
+        wait_until = hedge_at if hedge_at is not None and attempts < max_attempts else deadline
+        done, pending = wait(pending, timeout=max(0.0, wait_until - elapsed), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            error = future.exception()
+            if error is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            last_error = error
+
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        if attempts < max_attempts and (not done or not pending):
+            # The hedge delay passed, or the only attempt failed early
+            attempts += 1
+            if slots is None or slots.try_acquire(priority):
+                pending.add(_submit_holding(executor, slots, function, remaining + CLIENT_TIMEOUT_GRACE_SECONDS))
+
+    for future in pending:
+        future.cancel()
+    if pending or last_error is None:
+        raise DeadlineExceeded(f"No response within {deadline:.1f}s")
+    raise last_error
+
+def _start_holding(slots, coroutine_function, timeout):
+    task = asyncio.ensure_future(coroutine_function(timeout))
+    if slots is not None:
+        task.add_done_callback(lambda _: slots.release())
+    return task
+
+async def call_with_deadline_async(coroutine_function, deadline=LLM_DEADLINE_SECONDS,
+                                   hedge_after=LLM_HEDGE_AFTER_SECONDS, priority=False, slots=None):
+    """
+    Async version of call_with_deadline: awaits coroutine_function(timeout)
+    with the same deadline, hedging and slot rules. Unfinished attempts
+    are cancelled.
+    """
+    max_attempts, hedge_at = _attempt_plan(deadline, hedge_after)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    pending = {_start_holding(slots, coroutine_function, deadline + CLIENT_TIMEOUT_GRACE_SECONDS)}
+    attempts = 1
+    last_error = None
+
+    try:
+        while pending:
+            elapsed = loop.time() - started
+            wait_until = hedge_at if hedge_at is not None and attempts < max_attempts else deadline
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, wait_until - elapsed), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return task.result()
+                last_error = error
+
+            remaining = deadline - (loop.time() - started)
+            if remaining <= 0:
+                break
+            if attempts < max_attempts and (not done or not pending):
+                attempts += 1
+                if slots is None or slots.try_acquire(priority):
+                    pending.add(_start_holding(slots, coroutine_function, remaining + CLIENT_TIMEOUT_GRACE_SECONDS))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if pending or last_error is None:
+        raise DeadlineExceeded(f"No response within {deadline:.1f}s")
+    raise last_error
+
+
+_STREAM_END = object()
+
+def stream_with_deadline(iterator_function, deadline=LLM_DEADLINE_SECONDS, priority=False, slots=None):
+    """
+    Iterate over iterator_function(timeout) on the shared pool, yielding
+    its items. Raises DeadlineExceeded if the first item takes longer
+    than deadline seconds, or if the stream then stalls for that long.
+    The caller's slot, if given, is held until the upstream stream ends.
+    """
+    items = queue.Queue()
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for item in iterator_function(deadline + CLIENT_TIMEOUT_GRACE_SECONDS):
+                if stopped.is_set():
+                    return
+                items.put((item, None))
+            items.put((_STREAM_END, None))
+        except Exception as e:
+            items.put((_STREAM_END, e))
+
+    _submit_holding(get_executor(priority), slots, produce)
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=deadline)
+            except queue.Empty:
+                raise DeadlineExceeded(f"Stream stalled for {deadline:.1f}s")
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
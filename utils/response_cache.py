@@ -0,0 +1,118 @@
+"""
+Response Cache - LRU cache with TTLs for generated replies to common messages
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from utils.keyword_matcher import tokenize
+
+# Cache limits, overridable through the environment (size 0 disables caching)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", 600))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
+
+def normalize_message(message):
+    """
+    Normalize a message for cache lookups so that case, punctuation and
+    spacing differences ("I feel anxious!" vs "i feel anxious") share an entry.
+    """
+    return " ".join(tokenize(message))
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache bounded by entry count and total size. Entries
+    older than the TTL are misses for get() but remain available to
+    get_stale() until they are evicted.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    @staticmethod
+    def make_key(user_message, prompt_variant, concern_level):
+        return (normalize_message(user_message), prompt_variant, concern_level)
+
+    def get(self, key):
+        """
+        Return the cached reply for key, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                # Expired entries stay until evicted so get_stale can
+                # still use them when the model is unavailable
+            self.misses += 1
+            return None
+
+    def get_stale(self, key):
+        """
+        Return the cached reply for key even if it has expired, or None.
+        Used as a fallback when a fresh reply can't be generated in time.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale_hits': self.stale_hits,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds
+            }
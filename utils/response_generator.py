@@ -1,13 +1,26 @@
 """
-Response Generator - Uses Google Generative AI API to generate empathetic responses
+Response Generator - Uses Google Generative AI API (or another configured
+LLM provider) to generate empathetic responses
 """
 
 import os
-import google.generativeai as genai
+import time
 import random
+from functools import lru_cache
 from dotenv import load_dotenv
 import traceback
 
+from utils.mental_health_utils import get_concern_level
+from utils.response_cache import ResponseCache, normalize_message
+from utils.prompt_templates import PROMPT_TEMPLATES, get_prompt_variant
+from utils.context_window import ContextAssembler
+from utils.metrics import timed, STAGE_LATENCY, FALLBACK_RESPONSES as FALLBACK_COUNTER, ERRORS
+from utils.resilience import (CircuitOpen, DeadlineExceeded, call_with_deadline, call_with_deadline_async,
+                              stream_with_deadline)
+from utils.llm_providers import get_genai, create_router, TemplateProvider, ProviderNotConfigured
+from utils.single_flight import SingleFlight, AsyncSingleFlight
+from utils.admission import model_call_limiter, ModelCallsExhausted
+
 # Load environment variables
 load_dotenv()
 
@@ -15,21 +28,45 @@ load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 if not api_key:
     print("WARNING: GOOGLE_API_KEY not found in .env file!")
-else:
-    genai.configure(api_key=api_key)
-    # List available models to debug
+
+@lru_cache(maxsize=None)
+def list_available_models():
+    """
+    List the models that support generateContent. This is a network call,
+    so it only runs when asked for (e.g. LIST_GENAI_MODELS=True at startup).
+    """
     try:
         available_models = []
-        for model in genai.list_models():
+        for model in get_genai().list_models():
             if "generateContent" in model.supported_generation_methods:
                 available_models.append(model.name)
                 print(f"Available model: {model.name}")
+        return tuple(available_models)
     except Exception as e:
         print(f"Error listing models: {e}")
+        return ()
 
 # Set the model name to use - this one has been confirmed working
 MODEL_NAME = "gemini-1.5-flash"  # Using the tested and working model
 
+# Generation settings per concern level; crisis replies use a lower temperature
+GENERATION_CONFIGS = {
+    "low": {"temperature": 0.7, "max_output_tokens": 800},
+    "moderate": {"temperature": 0.7, "max_output_tokens": 800},
+    "high": {"temperature": 0.6, "max_output_tokens": 800},
+    "critical": {"temperature": 0.4, "max_output_tokens": 800},
+}
+
+# Replies to common, non-crisis messages are reused instead of regenerated
+response_cache = ResponseCache()
+
+# Per-session conversation context included in the prompt
+context_assembler = ContextAssembler()
+
+# Concurrent requests with the same prompt share one upstream call
+model_flights = SingleFlight()
+async_model_flights = AsyncSingleFlight()
+
 # Backup responses in case API fails
 FALLBACK_RESPONSES = {
     "greeting": [
@@ -64,130 +101,375 @@ FALLBACK_RESPONSES = {
     ]
 }
 
-def create_prompt(user_message, mental_health_data):
+def get_fallback_category(mental_health_data):
     """
-    Create a system prompt based on mental health data
+    FALLBACK_RESPONSES category matching the detected mental health state
     """
-    # Determine the most prominent issue
-    issues = {
-        'anxiety': mental_health_data['anxiety'],
-        'depression': mental_health_data['depression'],
-        'burnout': mental_health_data['burnout']
-    }
-    prominent_issue = max(issues, key=issues.get)
-    
-    # Build the system prompt
-    system_prompt = (
-        "You are an empathetic mental health support chatbot with expertise in emotional support. "
-        "Follow these guidelines:\n\n"
-        "1. TONE & STYLE:\n"
-        "- Use a warm, compassionate, and understanding tone\n"
-        "- Validate emotions and experiences\n"
-        "- Write responses in 3-4 sentence and exceed if there is a need \n"
-        "- Use phrases like 'I understand', 'It's completely normal to feel', 'You're not alone'\n\n"
-        "2. RESPONSE STRUCTURE:\n"
-        "- If user is facing a problem, first notify him the issue he is facing"
-        "- Start with emotional acknowledgment\n"
-        "- Provide gentle guidance and support\n"
-        "- Include one practical suggestion or coping strategy\n"
-        "- End with a supportive statement\n\n"
-        "3. RESOURCES:\n"
-        "-Provide resources only if the user asks for resources"
-        "- Include 1-2 relevant online resources or websites\n"
-        "- Suggest appropriate self-help tools or apps\n"
-        "- Mention credible mental health organizations\n\n"
-        "4. FORMATTING & READABILITY:\n"
-        "- Use proper Markdown formatting in your responses\n"
-        "- Split text into paragraphs (2-3 sentences per paragraph)\n"
-        "- Use **bold** for emphasis on important words or phrases\n"
-        "- Use bullet points for lists when appropriate\n"
-        "- Include a clear visual structure with spaces between paragraphs\n\n"
-        "5. IMPORTANT RULES:\n"
-        "- NEVER diagnose or provide medical advice\n"
-        "- Keep responses conversational yet professional\n"
-        "- Always prioritize user safety\n"
-        "- Encourage professional help when appropriate\n\n"
-    )
+    if mental_health_data['immediate_help']:
+        return "critical"
+    elif mental_health_data['anxiety'] > 0.3:
+        return "anxiety"
+    elif mental_health_data['depression'] > 0.3:
+        return "depression"
+    elif mental_health_data['burnout'] > 0.3:
+        return "burnout"
+    else:
+        return "general"
+
+# Providers and the concern level -> provider routing (see utils/llm_providers.py)
+llm_router = create_router(MODEL_NAME, GENERATION_CONFIGS,
+                           TemplateProvider(FALLBACK_RESPONSES, get_fallback_category))
+
+def warm_up(connect=False):
+    """
+    Set up the clients of every routed provider ahead of the first
+    request. With connect=True also makes a cheap API call so the
+    connection is already open. Returns True if they are ready.
+    """
+    ready = True
+    for provider in llm_router.active_providers():
+        if not provider.is_configured():
+            ready = False
+            continue
+        try:
+            provider.warm_up(connect)
+        except Exception as e:
+            print(f"Error warming up the {provider.name} provider: {e}")
+            ready = False
     
-    # Add information about detected issues
+    if os.getenv("LIST_GENAI_MODELS") == 'True' and os.getenv("GOOGLE_API_KEY"):
+        list_available_models()
+    return ready
+
+def create_prompt(user_message, mental_health_data):
+    """
+    Return the prebuilt system prompt for the detected mental health state
+    """
+    return PROMPT_TEMPLATES.get(get_prompt_variant(mental_health_data))
+
+def build_context(user_message, conversation_history, session_id=None):
+    """
+    Return the conversation context for the turns before the current
+    message. With a session_id only turns added since the session's last
+    request are processed.
+    """
+    if not conversation_history:
+        return ""
+    end = len(conversation_history)
+    last_turn = conversation_history[-1]
+    if last_turn.role == 'user' and last_turn.content == user_message:
+        end -= 1
+    if session_id is None:
+        return ContextAssembler(max_sessions=1).build(None, conversation_history, end)
+    return context_assembler.build(session_id, conversation_history, end)
+
+def build_prompt(system_prompt, context, user_message):
+    """
+    Combine the system prompt, conversation context and user message
+    """
+    return f"{system_prompt}\n\n{context}User: {user_message}\n\nResponse:"
+
+def get_cache_key(user_message, mental_health_data, concern_level, context=""):
+    """
+    Return the response cache key for a request, or None if the reply must
+    always come from the model. Crisis messages are never cached, and
+    neither are replies that depend on a session's earlier conversation.
+    """
+    if mental_health_data['immediate_help'] or concern_level == "critical" or context:
+        return None
+    prompt_variant = (PROMPT_TEMPLATES.version, get_prompt_variant(mental_health_data))
+    return ResponseCache.make_key(user_message, prompt_variant, concern_level)
+
+def get_flight_key(user_message, mental_health_data, concern_level, context, provider):
+    """
+    Key under which identical in-flight prompts are coalesced, or None for
+    crisis messages, which always get their own call
+    """
     if mental_health_data['immediate_help']:
-        system_prompt += (
-            "The user may be in crisis and need immediate help. "
-            "Express concern, validate their feelings, and strongly encourage "
-            "them to contact a crisis service immediately. Be direct but compassionate."
+        return None
+    return (provider.name, concern_level, PROMPT_TEMPLATES.version,
+            get_prompt_variant(mental_health_data), context, normalize_message(user_message))
+
+def get_provider(concern_level):
+    """
+    Return the provider routed to for a concern level, or raise
+    ProviderNotConfigured if it has no credentials or endpoint
+    """
+    provider = llm_router.for_level(concern_level)
+    if not provider.is_configured():
+        raise ProviderNotConfigured(f"The {provider.name} provider is not configured")
+    return provider
+
+def acquire_model_call(provider, mental_health_data):
+    """
+    Take one of the process's model-call slots (crisis messages always get
+    one), then check the provider's circuit breaker
+    """
+    if not model_call_limiter.try_acquire(priority=mental_health_data['immediate_help']):
+        raise ModelCallsExhausted("Too many model calls in flight")
+    if not provider.breaker.allow():
+        model_call_limiter.release()
+        raise CircuitOpen(f"{provider.name} circuit is open")
+
+def call_model(provider, prompt, concern_level, mental_health_data):
+    """
+    Generate a reply within the latency budget, through the provider's
+    circuit breaker. Crisis messages run on the priority pool.
+    """
+    acquire_model_call(provider, mental_health_data)
+    try:
+        # The slot is handed over and held until the upstream call ends
+        text = call_with_deadline(
+            lambda timeout: provider.generate(prompt, concern_level, mental_health_data, timeout),
+            priority=mental_health_data['immediate_help'],
+            slots=model_call_limiter
         )
-    elif issues[prominent_issue] > 0.3:
-        system_prompt += f"The user may be experiencing {prominent_issue}. "
-        if prominent_issue == 'anxiety':
-            system_prompt += "Focus on grounding techniques and present moment awareness."
-        elif prominent_issue == 'depression':
-            system_prompt += "Offer gentle encouragement and validate their feelings."
-        elif prominent_issue == 'burnout':
-            system_prompt += "Emphasize the importance of rest and boundaries."
-            
-    return system_prompt
+    except Exception:
+        provider.breaker.record_failure()
+        raise
+    provider.breaker.record_success()
+    return text
+
+def stream_model(provider, prompt, concern_level, mental_health_data):
+    """
+    Yield reply chunks through the provider's circuit breaker. The first
+    chunk, and each one after it, must arrive within the latency budget.
+    """
+    acquire_model_call(provider, mental_health_data)
+    try:
+        yield from stream_with_deadline(
+            lambda timeout: provider.stream(prompt, concern_level, mental_health_data, timeout),
+            priority=mental_health_data['immediate_help'],
+            slots=model_call_limiter
+        )
+    except GeneratorExit:
+        # The client went away mid-stream; the upstream was answering
+        provider.breaker.record_success()
+        raise
+    except Exception:
+        provider.breaker.record_failure()
+        raise
+    provider.breaker.record_success()
+
+async def call_model_async(provider, prompt, concern_level, mental_health_data):
+    """
+    Async version of call_model
+    """
+    acquire_model_call(provider, mental_health_data)
+    try:
+        text = await call_with_deadline_async(
+            lambda timeout: provider.generate_async(prompt, concern_level, mental_health_data, timeout),
+            priority=mental_health_data['immediate_help'],
+            slots=model_call_limiter
+        )
+    except Exception:
+        provider.breaker.record_failure()
+        raise
+    provider.breaker.record_success()
+    return text
 
-def generate_response(user_message, mental_health_data, conversation_history=None):
+def generate_response(user_message, mental_health_data, conversation_history=None, session_id=None):
     """
-    Generate a response using the Google Generative AI API with improved error handling
+    Generate a response using the configured LLM provider with improved error handling
     """
     if conversation_history is None:
         conversation_history = []
     
     # Default to using fallback responses
     use_fallback = False
+    cache_key = None
+    error = None
         
     try:
-        # Check if API key is available
-        if not os.getenv("GOOGLE_API_KEY"):
-            print("No Google API key found - using fallback response")
-            raise ValueError("GOOGLE_API_KEY environment variable is not set")
+        # Check if the routed provider has an API key or endpoint
+        concern_level = get_concern_level(mental_health_data)
+        try:
+            provider = get_provider(concern_level)
+        except ProviderNotConfigured as e:
+            print(f"{e} - using fallback response")
+            raise
             
         # Create the prompt incorporating the mental health analysis
-        system_prompt = create_prompt(user_message, mental_health_data)
+        with timed("prompt_build"):
+            system_prompt = create_prompt(user_message, mental_health_data)
+            context = build_context(user_message, conversation_history, session_id)
+            prompt = build_prompt(system_prompt, context, user_message)
+        
+        # Serve common messages from the cache
+        cache_key = get_cache_key(user_message, mental_health_data, concern_level, context)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        # Configure the model with simplified generation parameters
-        generation_config = {
-            "temperature": 0.7,
-            "max_output_tokens": 800,
-        }
-
         try:
-            # Initialize the model with recommended model
-            model = genai.GenerativeModel(
-                model_name=MODEL_NAME,
-                generation_config=generation_config
-            )
-            
-            # Create prompt with system instructions and user message
-            prompt = f"{system_prompt}\n\nUser: {user_message}\n\nResponse:"
-            
-            # Generate the response
-            response = model.generate_content(prompt)
+            # Generate the response, giving up at the deadline
+            flight_key = get_flight_key(user_message, mental_health_data, concern_level, context, provider)
+            with timed("model_call"):
+                text = model_flights.do(
+                    flight_key, lambda: call_model(provider, prompt, concern_level, mental_health_data)
+                )
             
             # Return the text content
-            return response.text
+            if cache_key is not None:
+                response_cache.set(cache_key, text)
+            return text
         
         except Exception as model_error:
-            print(f"Error with {MODEL_NAME}: {model_error}")
-            print(traceback.format_exc())
+            print(f"Error with the {provider.name} provider: {model_error}")
             use_fallback = True
             raise model_error
             
     except Exception as e:
-        print(f"Error generating response with Google Gemini API: {e}")
-        print(traceback.format_exc())
+        print(f"Error generating response: {e}")
+        if not isinstance(e, (DeadlineExceeded, CircuitOpen, ProviderNotConfigured, ModelCallsExhausted)):
+            print(traceback.format_exc())
         use_fallback = True
+        error = e
     
     # Use fallback responses if API fails
     if use_fallback:
-        if mental_health_data['immediate_help']:
-            return random.choice(FALLBACK_RESPONSES["critical"])
-        elif mental_health_data['anxiety'] > 0.3:
-            return random.choice(FALLBACK_RESPONSES["anxiety"])
-        elif mental_health_data['depression'] > 0.3:
-            return random.choice(FALLBACK_RESPONSES["depression"])  
-        elif mental_health_data['burnout'] > 0.3:
-            return random.choice(FALLBACK_RESPONSES["burnout"])
-        else:
-            return random.choice(FALLBACK_RESPONSES["general"])
+        return get_degraded_response(mental_health_data, cache_key, error)
+
+def fallback_reason(error=None):
+    """
+    Label for the fallback counter: unconfigured provider, missed deadline,
+    open circuit, too many calls in flight or a failed model call
+    """
+    if isinstance(error, DeadlineExceeded):
+        return "deadline"
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, ProviderNotConfigured):
+        return "no_api_key"
+    if isinstance(error, ModelCallsExhausted):
+        return "overloaded"
+    return "model_error"
+
+def get_degraded_response(mental_health_data, cache_key, error, location="model_call"):
+    """
+    Reply used when the model can't answer in time: a cached reply for the
+    same message if there is one, even an expired one, otherwise a canned
+    response for the detected state
+    """
+    reason = fallback_reason(error)
+    if reason == "model_error":
+        ERRORS.inc(location)
+    
+    if cache_key is not None:
+        stale = response_cache.get_stale(cache_key)
+        if stale is not None:
+            FALLBACK_COUNTER.inc("stale_cache")
+            return stale
+    return get_fallback_response(mental_health_data, reason)
+
+def get_fallback_response(mental_health_data, reason="model_error"):
+    """
+    Pick a canned response matching the detected mental health state
+    """
+    FALLBACK_COUNTER.inc(reason)
+    with timed("fallback"):
+        return random.choice(FALLBACK_RESPONSES[get_fallback_category(mental_health_data)])
+
+def generate_response_stream(user_message, mental_health_data, conversation_history=None, session_id=None,
+                             fallback=True):
+    """
+    Generate a response like generate_response, but yield text chunks as
+    the model produces them. Falls back to a cached or canned response if
+    the API fails or misses the deadline before the first chunk arrives,
+    unless fallback is False, in which case nothing more is yielded.
+    """
+    if conversation_history is None:
+        conversation_history = []
+    
+    sent_any = False
+    cache_key = None
+    try:
+        concern_level = get_concern_level(mental_health_data)
+        provider = get_provider(concern_level)
+            
+        with timed("prompt_build"):
+            system_prompt = create_prompt(user_message, mental_health_data)
+            context = build_context(user_message, conversation_history, session_id)
+            prompt = build_prompt(system_prompt, context, user_message)
+        
+        cache_key = get_cache_key(user_message, mental_health_data, concern_level, context)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks = []
+        started = time.perf_counter()
+        for text in stream_model(provider, prompt, concern_level, mental_health_data):
+            if text:
+                if not sent_any:
+                    STAGE_LATENCY.observe(time.perf_counter() - started, "model_first_token")
+                sent_any = True
+                chunks.append(text)
+                yield text
+        STAGE_LATENCY.observe(time.perf_counter() - started, "model_call")
+        
+        if sent_any:
+            if cache_key is not None:
+                response_cache.set(cache_key, "".join(chunks))
+            return
+        error = None
+            
+    except Exception as e:
+        print(f"Error streaming response: {e}")
+        if not isinstance(e, (DeadlineExceeded, CircuitOpen, ProviderNotConfigured, ModelCallsExhausted)):
+            print(traceback.format_exc())
+        if sent_any:
+            # The user already has a partial answer; don't append a canned one
+            if fallback_reason(e) == "model_error":
+                ERRORS.inc("model_stream")
+            return
+        error = e
+    
+    if fallback:
+        yield get_degraded_response(mental_health_data, cache_key, error, "model_stream")
+    elif fallback_reason(error) == "model_error":
+        ERRORS.inc("model_stream")
+
+async def generate_response_async(user_message, mental_health_data, conversation_history=None, session_id=None):
+    """
+    Async version of generate_response for the asyncio serving path.
+    Awaits the model call so the event loop can serve other requests.
+    """
+    if conversation_history is None:
+        conversation_history = []
+    
+    cache_key = None
+    try:
+        concern_level = get_concern_level(mental_health_data)
+        provider = get_provider(concern_level)
+            
+        with timed("prompt_build"):
+            system_prompt = create_prompt(user_message, mental_health_data)
+            context = build_context(user_message, conversation_history, session_id)
+            prompt = build_prompt(system_prompt, context, user_message)
+        
+        cache_key = get_cache_key(user_message, mental_health_data, concern_level, context)
+        if cache_key is not None:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        flight_key = get_flight_key(user_message, mental_health_data, concern_level, context, provider)
+        with timed("model_call"):
+            text = await async_model_flights.do(
+                flight_key, lambda: call_model_async(provider, prompt, concern_level, mental_health_data)
+            )
+        if cache_key is not None:
+            response_cache.set(cache_key, text)
+        return text
+        
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        if not isinstance(e, (DeadlineExceeded, CircuitOpen, ProviderNotConfigured, ModelCallsExhausted)):
+            print(traceback.format_exc())
+        error = e
+    
+    return get_degraded_response(mental_health_data, cache_key, error)
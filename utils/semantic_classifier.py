@@ -0,0 +1,230 @@
+"""
+Semantic Classifier - Scores messages by embedding similarity to labeled
+exemplar phrases, so paraphrases the keyword lists miss are still caught
+"""
+
+import hashlib
+import json
+import os
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from utils.keyword_matcher import tokenize
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Labeled exemplar phrases for each category
+SEMANTIC_EXEMPLARS_FILE = os.getenv(
+    "SEMANTIC_EXEMPLARS_FILE", os.path.join(PROJECT_ROOT, "utils", "semantic_exemplars.json")
+)
+# Where the precomputed exemplar matrix is stored and memory-mapped from
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", os.path.join(PROJECT_ROOT, ".semantic_index"))
+# Optional sentence-transformers model; the hashed n-gram embedder is used without it
+SEMANTIC_EMBEDDING_MODEL = os.getenv("SEMANTIC_EMBEDDING_MODEL")
+# Embeddings of recent messages kept in memory
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 4096))
+
+# Similarities at or below the floor score 0, at or above the ceiling 1
+SIMILARITY_FLOOR = float(os.getenv("SEMANTIC_SIMILARITY_FLOOR", 0.25))
+SIMILARITY_CEILING = float(os.getenv("SEMANTIC_SIMILARITY_CEILING", 0.75))
+# Similarity to a suicidal exemplar that flags a message for immediate help,
+# and how far it must be above the closest ordinary (neutral) exemplar.
+# Idioms such as "no way out of this parking garage" come within 0.4.
+CRISIS_SIMILARITY = float(os.getenv("SEMANTIC_CRISIS_SIMILARITY", 0.6))
+CRISIS_MARGIN = float(os.getenv("SEMANTIC_CRISIS_MARGIN", 0.5))
+
+# Category that anchors ordinary messages; it is matched but never scored
+NEUTRAL_CATEGORY = 'neutral'
+
+# Very common words carry no signal as unigrams (they still form bigrams)
+STOP_WORDS = frozenset([
+    'i', 'me', 'my', 'a', 'an', 'the', 'and', 'or', 'to', 'of', 'in', 'on', 'at', 'it',
+    'is', 'am', 'are', 'be', 'been', 'so', 'for', 'with', 'that', 'this', 'just', 'about'
+])
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedder: word unigrams, word bigrams and character
+    n-grams hashed into a fixed number of signed buckets. Uses crc32, so
+    vectors are identical across processes and runs.
+    """
+
+    def __init__(self, dim=2048, char_ngrams=(3, 5)):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+        self.name = f"hashing-{dim}-{char_ngrams[0]}-{char_ngrams[1]}"
+
+    def _features(self, tokens):
+        for token in tokens:
+            if token not in STOP_WORDS:
+                yield "w:" + token, 1.0
+            padded = f" {token} "
+            for n in range(self.char_ngrams[0], self.char_ngrams[1] + 1):
+                for start in range(len(padded) - n + 1):
+                    yield "c:" + padded[start:start + n], 0.5
+        for first, second in zip(tokens, tokens[1:]):
+            yield "b:" + first + " " + second, 1.0
+
+    def embed(self, text):
+        tokens = tokenize(text)
+        features = list(self._features(tokens))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature, _ in features),
+                             dtype=np.uint32, count=len(features))
+        weights = np.fromiter((weight for _, weight in features), dtype=np.float32, count=len(features))
+        # The top bit picks the sign so colliding features tend to cancel out
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        vector = np.bincount(hashes % self.dim, weights=weights * signs, minlength=self.dim).astype(np.float32)
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts):
+        return np.vstack([self.embed(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+
+class SentenceTransformerEmbedder:
+    """
+    Small CPU sentence embedding model (e.g. all-MiniLM-L6-v2) through the
+    optional sentence-transformers package
+    """
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = "st-" + model_name.replace("/", "-")
+
+    def embed(self, text):
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def embed_many(self, texts):
+        return self.model.encode(list(texts), normalize_embeddings=True, batch_size=64).astype(np.float32)
+
+
+def create_embedder(model_name=SEMANTIC_EMBEDDING_MODEL):
+    """
+    The configured sentence-transformers model, or the hashing embedder if
+    none is configured or it can't be loaded
+    """
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"Error loading embedding model {model_name}: {e} - using hashed n-grams")
+    return HashingEmbedder()
+
+
+def load_exemplars(path=SEMANTIC_EXEMPLARS_FILE):
+    """
+    Return (categories, phrases, row category indices), rows grouped by
+    category in file order
+    """
+    with open(path) as f:
+        data = json.load(f)
+    categories = list(data['categories'])
+    phrases = []
+    row_categories = []
+    for index, category in enumerate(categories):
+        for phrase in data['categories'][category]:
+            phrases.append(phrase)
+            row_categories.append(index)
+    return categories, phrases, np.array(row_categories, dtype=np.int32)
+
+def build_index(embedder, phrases, path):
+    """
+    Embed the exemplar phrases and save the matrix as a .npy file. Written
+    to a temporary name first so concurrent workers never read a partial
+    file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    matrix = embedder.embed_many(phrases)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        np.save(f, matrix)
+    os.replace(temporary, path)
+
+def open_index(embedder, phrases, index_dir=SEMANTIC_INDEX_DIR):
+    """
+    Memory-map the exemplar matrix, building it first if the exemplars or
+    the embedder changed. Worker processes share the mapped pages.
+    """
+    fingerprint = hashlib.sha1("\n".join([embedder.name, *phrases]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(index_dir, f"exemplars-{fingerprint}.npy")
+    if not os.path.exists(path):
+        build_index(embedder, phrases, path)
+    return np.load(path, mmap_mode="r")
+
+
+class SemanticClassifier:
+    """
+    Cosine similarity between a message and every exemplar in one matrix
+    product, reduced to the best match per category
+    """
+
+    def __init__(self, embedder=None, exemplars_path=SEMANTIC_EXEMPLARS_FILE, index_dir=SEMANTIC_INDEX_DIR,
+                 cache_size=SEMANTIC_CACHE_SIZE):
+        self.embedder = embedder if embedder is not None else create_embedder()
+        self.categories, phrases, row_categories = load_exemplars(exemplars_path)
+        self.matrix = open_index(self.embedder, phrases, index_dir)
+        # Rows are grouped by category, so each category is one slice
+        self._starts = np.searchsorted(row_categories, np.arange(len(self.categories)))
+        self.embed = lru_cache(maxsize=cache_size)(self._embed)
+
+    def _embed(self, normalized_text):
+        vector = self.embedder.embed(normalized_text)
+        vector.setflags(write=False)
+        return vector
+
+    def similarities(self, message):
+        """
+        Return {category: highest cosine similarity to its exemplars}
+        """
+        vector = self.embed(" ".join(tokenize(message)))
+        best = np.maximum.reduceat(self.matrix @ vector, self._starts)
+        return dict(zip(self.categories, best.tolist()))
+
+    def scores(self, message):
+        """
+        Return ({category: score between 0 and 1}, crisis flag). A category
+        only scores if the message is closer to it than to ordinary chat.
+        The crisis flag needs a much wider lead over ordinary chat, since
+        idioms ("no way out of this parking lot") also match closely.
+        """
+        similarities = self.similarities(message)
+        neutral = similarities.pop(NEUTRAL_CATEGORY, 0.0)
+        span = SIMILARITY_CEILING - SIMILARITY_FLOOR
+        scores = {}
+        for category, similarity in similarities.items():
+            if similarity <= neutral:
+                scores[category] = 0.0
+            else:
+                scores[category] = min(max((similarity - SIMILARITY_FLOOR) / span, 0.0), 1.0)
+        suicidal = similarities.get('suicidal', 0.0)
+        crisis = suicidal >= CRISIS_SIMILARITY and suicidal - neutral >= CRISIS_MARGIN
+        return scores, crisis
+
+    def cache_info(self):
+        return self.embed.cache_info()
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_semantic_classifier():
+    """
+    Shared classifier, built on first use
+    """
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = SemanticClassifier()
+    return _classifier
@@ -0,0 +1,124 @@
+"""
+Single Flight - Collapses concurrent identical calls into one, so a burst
+of the same prompt makes a single upstream request
+"""
+
+import asyncio
+import copy
+import threading
+
+
+def _copy_error(error):
+    """
+    Give each waiter its own exception object, since raising one instance
+    in several threads at once interleaves their tracebacks
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(str(error))
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    The first caller for a key (the leader) runs the function straight away;
+    callers arriving with the same key while it runs wait for and share its
+    result or exception. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        """
+        Return function(), sharing the call with concurrent callers using
+        the same key. A key of None always calls function directly.
+        """
+        if key is None:
+            return function()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def metrics(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio version of SingleFlight for calls made on one event loop
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key, coroutine_function):
+        if key is None:
+            return await coroutine_function()
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            # shield: a cancelled follower must not cancel the leader's call
+            return await asyncio.shield(future)
+
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await coroutine_function()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        finally:
+            del self._calls[key]
+            # Retrieve the exception so an unawaited future doesn't warn
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    def metrics(self):
+        return {'in_flight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
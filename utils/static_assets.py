@@ -0,0 +1,142 @@
+"""
+Static Assets - Content-hashed copies of the CSS and JavaScript files,
+pre-compressed with gzip (and brotli when installed), so they can be
+cached by browsers forever and sent without compressing per request
+
+Build before deploying (the app also rebuilds at startup when the
+sources no longer match the manifest):
+    python -m utils.static_assets
+"""
+
+import hashlib
+import json
+import os
+
+from utils.compression import compress, get_brotli
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(PROJECT_ROOT, "static")
+# Fingerprinted files are written under static/ so Flask can serve them
+DIST_SUBDIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+ASSET_EXTENSIONS = ('.css', '.js')
+# Fingerprinted names never change content, so clients may cache for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Extension of each pre-compressed variant
+ENCODING_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+
+def find_sources(static_dir=STATIC_DIR):
+    """
+    Return the static files to fingerprint, as paths relative to static_dir
+    """
+    sources = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if d != DIST_SUBDIR)
+        for name in sorted(files):
+            if name.endswith(ASSET_EXTENSIONS):
+                sources.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, "/"))
+    return sources
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def fingerprinted_name(filename, digest):
+    base, extension = os.path.splitext(filename)
+    return f"{base}.{digest}{extension}"
+
+def _write_atomic(path, data):
+    # Several workers may build at once; each file appears complete or not at all
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+def build(static_dir=STATIC_DIR):
+    """
+    Write the fingerprinted and compressed copies and the manifest.
+    Returns the manifest: {source name: {'path', 'etag', 'encodings'}}.
+    """
+    dist_dir = os.path.join(static_dir, DIST_SUBDIR)
+    manifest = {}
+    for filename in find_sources(static_dir):
+        with open(os.path.join(static_dir, filename), "rb") as f:
+            data = f.read()
+        digest = fingerprint(data)
+        target = fingerprinted_name(filename, digest)
+        target_path = os.path.join(dist_dir, target)
+        _write_atomic(target_path, data)
+
+        encodings = []
+        for encoding in ('br', 'gzip'):
+            if encoding == 'br' and get_brotli() is None:
+                continue
+            compressed = compress(data, encoding, level=11 if encoding == 'br' else 9)
+            # Only keep a variant if it is actually smaller
+            if len(compressed) < len(data):
+                _write_atomic(target_path + ENCODING_EXTENSIONS[encoding], compressed)
+                encodings.append(encoding)
+        manifest[filename] = {'path': f"{DIST_SUBDIR}/{target}", 'etag': digest, 'encodings': encodings}
+
+    _write_atomic(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+def load_manifest(static_dir=STATIC_DIR):
+    """
+    Return the current manifest, building it first if it is missing or any
+    source file has changed since the last build
+    """
+    path = os.path.join(static_dir, DIST_SUBDIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+
+    if manifest is not None:
+        sources = find_sources(static_dir)
+        if sorted(manifest) == sources:
+            for filename in sources:
+                with open(os.path.join(static_dir, filename), "rb") as f:
+                    if fingerprint(f.read()) != manifest[filename]['etag']:
+                        break
+            else:
+                return manifest
+
+    try:
+        return build(static_dir)
+    except OSError as e:
+        print(f"Error building static assets: {e} - serving unfingerprinted files")
+        return {}
+
+
+class AssetManifest:
+    """
+    Maps source names to fingerprinted URLs and finds the pre-compressed
+    variants when serving them
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self._by_path = {entry['path'][len(DIST_SUBDIR) + 1:]: entry for entry in manifest.values()}
+
+    def url_filename(self, filename):
+        """
+        The name to pass to url_for('static', ...) for a source file
+        """
+        entry = self.manifest.get(filename)
+        return entry['path'] if entry is not None else filename
+
+    def entry(self, dist_filename):
+        """
+        Manifest entry for a file under dist/, or None if it is not part
+        of the current build
+        """
+        return self._by_path.get(dist_filename)
+
+
+if __name__ == '__main__':
+    for source, entry in build().items():
+        print(f"{source} -> {entry['path']} ({', '.join(entry['encodings']) or 'uncompressed'})")
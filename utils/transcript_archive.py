@@ -0,0 +1,340 @@
+"""
+Transcript Archive - Write-behind archive of chat turns in compressed,
+rotated JSONL segments with a per-session index
+
+Requests only put turns on a bounded queue; a background thread writes
+them out in batches. Each batch becomes one independently compressed
+block (a gzip member or zstd frame), so a segment is still a valid
+.jsonl.gz / .jsonl.zst file, and the sidecar .idx file records which
+blocks hold each session's turns.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+# Turns waiting to be written; when full, new turns are dropped and counted
+TRANSCRIPT_QUEUE_SIZE = int(os.getenv("TRANSCRIPT_QUEUE_SIZE", 10000))
+# A segment is closed once it reaches this many compressed bytes or this age
+TRANSCRIPT_SEGMENT_BYTES = int(os.getenv("TRANSCRIPT_SEGMENT_BYTES", 64 * 1024 * 1024))
+TRANSCRIPT_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPT_SEGMENT_SECONDS", 3600))
+# Longest a turn waits before its batch is written and fsynced
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", 1.0))
+# Largest number of turns written as one compressed block
+TRANSCRIPT_BATCH_SIZE = int(os.getenv("TRANSCRIPT_BATCH_SIZE", 512))
+
+
+class GzipCodec:
+    name = "gzip"
+    extension = ".jsonl.gz"
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=6)
+
+    def decompress(self, data):
+        return gzip.decompress(data)
+
+
+class ZstdCodec:
+    """
+    Zstandard through the optional zstandard package: faster and smaller
+    than gzip
+    """
+    name = "zstd"
+    extension = ".jsonl.zst"
+
+    def __init__(self, level=3):
+        import zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+def get_codec(name="gzip"):
+    """
+    Return the codec for a name, falling back to gzip if zstandard is not
+    installed
+    """
+    if name == "zstd":
+        try:
+            return ZstdCodec()
+        except ImportError:
+            print("zstandard is not installed - archiving transcripts with gzip")
+    return GzipCodec()
+
+def codec_for_path(path):
+    return ZstdCodec() if path.endswith(ZstdCodec.extension) else GzipCodec()
+
+
+class _Segment:
+    """
+    An open segment file and its index file
+    """
+
+    def __init__(self, directory, codec, sequence):
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        # The pid keeps segments of several worker processes apart
+        base = os.path.join(directory, f"transcripts-{stamp}-{os.getpid()}-{sequence:04d}")
+        self.path = base + codec.extension
+        self.index_path = base + ".idx"
+        self.data = open(self.path, "ab")
+        self.index = open(self.index_path, "a")
+        self.size = 0
+        self.opened_at = time.monotonic()
+
+    def write_block(self, block, session_ids):
+        offset = self.size
+        self.data.write(block)
+        self.size += len(block)
+        for session_id in session_ids:
+            self.index.write(json.dumps({'session_id': session_id, 'offset': offset, 'length': len(block)}) + "\n")
+
+    def sync(self):
+        """
+        Make everything written so far durable: one fsync per batch
+        """
+        self.data.flush()
+        self.index.flush()
+        os.fsync(self.data.fileno())
+        os.fsync(self.index.fileno())
+
+    def close(self):
+        self.sync()
+        self.data.close()
+        self.index.close()
+
+
+class TranscriptArchiver:
+    """
+    Appends turns to the archive without blocking the caller. The writer
+    thread is started on first use, and again in a forked worker.
+    """
+
+    def __init__(self, directory, codec="gzip", queue_size=TRANSCRIPT_QUEUE_SIZE,
+                 segment_bytes=TRANSCRIPT_SEGMENT_BYTES, segment_seconds=TRANSCRIPT_SEGMENT_SECONDS,
+                 flush_interval=TRANSCRIPT_FLUSH_INTERVAL, batch_size=TRANSCRIPT_BATCH_SIZE):
+        self.directory = directory
+        self.codec = get_codec(codec)
+        self.queue_size = queue_size
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._segment = None
+        self._sequence = 0
+        self._counters = {'archived': 0, 'dropped': 0, 'batches': 0, 'segments': 0, 'bytes_written': 0,
+                          'write_errors': 0}
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads don't survive a fork, and the parent's segment is not ours
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._segment = None
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="transcript-archiver", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def archive(self, session_id, role, content, timestamp=None):
+        """
+        Queue one turn. Never blocks; returns False if the turn was dropped.
+        """
+        self._ensure_started()
+        record = (session_id, role, content, time.time() if timestamp is None else timestamp)
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._counters['dropped'] += 1
+            return False
+
+    def _next_batch(self):
+        """
+        Wait for a first turn, then keep collecting for up to flush_interval
+        or batch_size turns, so each fsync covers as many turns as possible
+        """
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            try:
+                if batch:
+                    self._write(batch)
+                self._maybe_rotate()
+            except Exception as e:
+                print(f"Error archiving transcripts: {e}")
+                with self._lock:
+                    self._counters['write_errors'] += 1
+
+    def _write(self, batch):
+        lines = []
+        session_ids = {}
+        for session_id, role, content, timestamp in batch:
+            lines.append(json.dumps({
+                'session_id': session_id,
+                'role': role,
+                'content': content,
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat()
+            }, ensure_ascii=False))
+            session_ids[session_id] = None
+        block = self.codec.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+        if self._segment is None:
+            self._sequence += 1
+            self._segment = _Segment(self.directory, self.codec, self._sequence)
+            with self._lock:
+                self._counters['segments'] += 1
+        self._segment.write_block(block, session_ids)
+        self._segment.sync()
+        with self._lock:
+            self._counters['archived'] += len(batch)
+            self._counters['batches'] += 1
+            self._counters['bytes_written'] += len(block)
+
+    def _maybe_rotate(self):
+        segment = self._segment
+        if segment is not None and (segment.size >= self.segment_bytes or
+                                    time.monotonic() - segment.opened_at >= self.segment_seconds):
+            segment.close()
+            self._segment = None
+
+    def close(self, timeout=5.0):
+        """
+        Write out everything still queued and close the current segment
+        """
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+        except Exception as e:
+            print(f"Error closing transcript archive: {e}")
+        self._pid = None
+
+    def metrics(self):
+        with self._lock:
+            values = dict(self._counters)
+        values['queued'] = self._queue.qsize() if self._queue is not None else 0
+        return values
+
+
+def read_session(directory, session_id):
+    """
+    Return a session's archived turns, oldest first. Only the blocks the
+    index lists for the session are read and decompressed.
+    """
+    turns = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".idx"):
+            continue
+        index_path = os.path.join(directory, name)
+        blocks = []
+        with open(index_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partial last line
+                    continue
+                if entry['session_id'] == session_id:
+                    blocks.append((entry['offset'], entry['length']))
+        if not blocks:
+            continue
+
+        base = index_path[:-len(".idx")]
+        path = next(base + codec.extension for codec in (GzipCodec, ZstdCodec)
+                    if os.path.exists(base + codec.extension))
+        codec = codec_for_path(path)
+        with open(path, "rb") as f:
+            for offset, length in blocks:
+                f.seek(offset)
+                for line in codec.decompress(f.read(length)).decode("utf-8").splitlines():
+                    record = json.loads(line)
+                    if record['session_id'] == session_id:
+                        turns.append(record)
+    # Worker processes write separate segments, so merge them by time
+    turns.sort(key=lambda turn: turn['timestamp'])
+    return turns
+
+
+class ArchivedConversationStore:
+    """
+    Wraps a conversation store so every appended turn is also archived
+    """
+
+    def __init__(self, store, archiver):
+        self.store = store
+        self.archiver = archiver
+
+    def append(self, session_id, role, content):
+        self.store.append(session_id, role, content)
+        self.archiver.archive(session_id, role, content)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+def create_transcript_archiver():
+    """
+    Archiver for TRANSCRIPT_ARCHIVE_DIR, or None if archiving is off.
+    TRANSCRIPT_COMPRESSION is gzip (default) or zstd.
+    """
+    directory = os.getenv("TRANSCRIPT_ARCHIVE_DIR")
+    if not directory:
+        return None
+    return TranscriptArchiver(directory, codec=os.getenv("TRANSCRIPT_COMPRESSION", "gzip"))
+
+
+if __name__ == '__main__':
+    import sys
+    # Print one session's archived turns: python -m utils.transcript_archive DIR SESSION_ID
+    for turn in read_session(sys.argv[1], sys.argv[2]):
+        print(json.dumps(turn, ensure_ascii=False))
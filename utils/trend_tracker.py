@@ -0,0 +1,105 @@
+"""
+Trend Tracker - Exponentially decayed per-session emotional scores, updated
+in constant time per message
+"""
+
+import os
+
+from utils.mental_health_utils import get_concern_level
+
+# Weight kept by the previous running score on each new message
+TREND_DECAY = float(os.getenv("TREND_DECAY", 0.6))
+# Consecutive rising turns after which the trending level is escalated
+ESCALATION_STREAK = int(os.getenv("TREND_ESCALATION_STREAK", 3))
+# Smallest increase of the peak running score that counts as rising
+RISE_THRESHOLD = 0.02
+
+TREND_CATEGORIES = ('anxiety', 'depression', 'burnout', 'suicidal')
+
+CONCERN_LEVELS = ['low', 'moderate', 'high', 'critical']
+
+# Key under which the trend is kept in the conversation store's session state
+TREND_STATE_KEY = 'trend'
+
+
+def higher_concern_level(first, second):
+    """
+    Return the more severe of two concern levels
+    """
+    return max(first, second, key=CONCERN_LEVELS.index)
+
+
+class EmotionalTrend:
+    """
+    Running, exponentially decayed scores for one session.
+    Each update is O(1) regardless of how long the session is.
+    """
+    __slots__ = ('scores', 'turns', 'rising_streak', 'peak')
+
+    def __init__(self, scores=None, turns=0, rising_streak=0, peak=0.0):
+        self.scores = dict.fromkeys(TREND_CATEGORIES, 0.0) if scores is None else scores
+        self.turns = turns
+        self.rising_streak = rising_streak
+        self.peak = peak
+
+    def update(self, mental_health_data, decay=TREND_DECAY):
+        """
+        Fold one message's analysis into the running scores
+        """
+        for category in TREND_CATEGORIES:
+            self.scores[category] = decay * self.scores[category] + (1 - decay) * mental_health_data[category]
+        self.turns += 1
+
+        peak = max(self.current_scores(decay).values())
+        if peak > self.peak + RISE_THRESHOLD:
+            self.rising_streak += 1
+        else:
+            self.rising_streak = 0
+        self.peak = peak
+
+    def current_scores(self, decay=TREND_DECAY):
+        """
+        Running scores corrected for the zero start, so the first few
+        messages are not underweighted
+        """
+        correction = 1 - decay ** self.turns if self.turns else 1.0
+        return {category: score / correction for category, score in self.scores.items()}
+
+    @property
+    def escalating(self):
+        return self.rising_streak >= ESCALATION_STREAK
+
+    def concern_level(self):
+        """
+        Concern level of the running scores, raised one step (up to high)
+        when concern has risen steadily across recent turns
+        """
+        level = get_concern_level({**self.current_scores(), 'immediate_help': False})
+        if self.escalating and level in ('low', 'moderate'):
+            level = CONCERN_LEVELS[CONCERN_LEVELS.index(level) + 1]
+        return level
+
+    def to_dict(self):
+        return {
+            'scores': self.scores,
+            'turns': self.turns,
+            'rising_streak': self.rising_streak,
+            'peak': self.peak
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return cls()
+        return cls(dict(data['scores']), data['turns'], data['rising_streak'], data['peak'])
+
+
+def update_trend(store, session_id, mental_health_data):
+    """
+    Load a session's trend from the conversation store, fold in the new
+    message and save it back. Returns the updated EmotionalTrend.
+    """
+    trend = EmotionalTrend.from_dict(store.get_state(session_id, TREND_STATE_KEY))
+    trend.update(mental_health_data)
+    store.set_state(session_id, TREND_STATE_KEY, trend.to_dict())
+    return trend